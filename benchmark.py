@@ -0,0 +1,463 @@
+"""Benchmarks for the simulation engines.
+
+Run with: python benchmark.py [--suite] [--json FILE] [--baseline FILE]
+
+The suite of scalable reference circuits can write its results as JSON and
+compare them against the JSON of an earlier run to catch regressions.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import types
+
+import chip
+import circuits
+import codegen
+import cycle
+import faults
+import fourstate
+import parallel
+import session
+import stimulus
+import view
+
+def timed(f, *args):
+    """Return the result of f(*args) and the seconds it took."""
+    start = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - start
+
+def bench_deep_chains(depth=10000, vectors=20):
+    """Time a depth-deep inverter chain and adder carry chain.
+
+    Both propagation modes are run; the connector mode drives the Connector
+    and Gate network from the agenda, so neither mode recurses per level.
+    The chips are not optimized, which would remove the inverter chain.
+    """
+    rng = random.Random(0)
+    for propagation in ['levelized', 'connector']:
+        c = chip.Chip(propagation, table_max_inputs = 0, optimize = False)
+        for label, build in [('inverter chain', circuits.build_inverter_chain),
+                             ('adder chain', circuits.build_ripple_adder)]:
+            name, build_time = timed(build, c, depth)
+            operation = c.chips[name]().operation
+            n = c.chips[name]().len_inputs
+            stimulus = [[rng.randint(0, 1) for _ in range(n)]
+                        for _ in range(vectors)]
+            _, run_time = timed(lambda: [operation(*v) for v in stimulus])
+            print('{0:>10} {1:<15} depth {2:>6}: build {3:7.3f}s, '
+                  '{4:9.1f} vectors/s'.format(propagation, label, depth,
+                                               build_time,
+                                               vectors / run_time))
+
+def bench_instantiation(count=10000, names=('full_adder', 'adder_100')):
+    """Time and measure instantiating count copies of compiled chips.
+
+    Every instance shares its chip's compiled netlist and only allocates its
+    own state vector, so memory per instance does not grow with gate count.
+    """
+    c = chip.Chip()
+    circuits.build_ripple_adder(c, 100)
+    for name in names:
+        make = c.chips[name]
+        tracemalloc.start()
+        instances, seconds = timed(lambda: [make() for _ in range(count)])
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        gates = instances[0].netlist.n_gates
+        print('{0:<12} x {1}: {2:7.3f}s, {3:7.0f} bytes/instance '
+              '({4} gates, {5} state bytes)'.format(
+                  name, count, seconds, size / count, gates,
+                  len(instances[0].state)))
+
+def netlist_bytes(compiled):
+    """Return the bytes held by the gate and net storage of a netlist."""
+    columns = [compiled.ops, compiled.ins_a, compiled.ins_b, compiled.outs]
+    names = sys.getsizeof(compiled.names) + sum(
+        sys.getsizeof(name) for name in compiled.names.values())
+    return sum(sys.getsizeof(column) for column in columns) + names + \
+        sys.getsizeof(compiled.inputs) + sys.getsizeof(compiled.outputs)
+
+def bench_representation(bits=10000):
+    """Report bytes per gate and per net of a bits-wide ripple adder.
+
+    Compares the compiled netlist columns, the per-instance state vector and
+    the Connector/Gate object graph that connector propagation builds.
+    """
+    c = chip.Chip()
+    name = circuits.build_ripple_adder(c, bits)
+    instance = c.chips[name]()
+    compiled = instance.netlist
+    tracemalloc.start()
+    c.connector_operation(compiled)
+    graph, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gates, nets = compiled.n_gates, compiled.n_nets
+    print('{0}: {1} gates, {2} nets'.format(name, gates, nets))
+    for label, size in [('netlist', netlist_bytes(compiled)),
+                        ('state', sys.getsizeof(instance.state)),
+                        ('connector graph', graph)]:
+        print('  {0:<16} {1:7.1f} bytes/gate {2:7.1f} bytes/net'.format(
+            label, size / gates, size / nets))
+
+def bench_parallel(bits=10, max_workers=None):
+    """Time exhaustive truth tables of a bits-wide adder with more workers."""
+    c = chip.Chip()
+    name = circuits.build_ripple_adder(c, bits)
+    compiled = c.chips[name]().netlist
+    vectors = 1 << len(compiled.inputs)
+    max_workers = max_workers or os.cpu_count() or 1
+    workers = 1
+    while workers <= max_workers:
+        _, seconds = timed(parallel.truth_table, compiled, workers)
+        print('{0} x 2**{1} vectors, {2:2} workers: {3:7.3f}s, '
+              '{4:12.0f} vectors/s'.format(name, len(compiled.inputs),
+                                           workers, seconds,
+                                           vectors / seconds))
+        workers *= 2
+
+def bench_counter(bits=16, cycles=100000, width=64):
+    """Report clock cycles per second of a bits-wide counter."""
+    c = chip.Chip()
+    name = circuits.build_counter(c, bits)
+    for copies in [1, width]:
+        engine = cycle.CycleEngine(c.chips[name]().netlist, copies)
+        engine.run(itertools.repeat([(1 << copies) - 1], cycles))
+        print('{0} x {1:2} copies: {2:10.0f} cycles/s'.format(
+            name, copies, engine.cycles_per_second()))
+
+def bench_codegen(bits=64, vectors=500, width=64):
+    """Compare generated code with the other ways of evaluating an adder.
+
+    Scalar rates are single vectors per second; the packed rates evaluate
+    width vectors per call.
+    """
+    rng = random.Random(0)
+    stimulus = [[rng.randint(0, 1) for _ in range(2 * bits + 1)]
+                for _ in range(vectors)]
+    for propagation in ['connector', 'levelized', 'compiled']:
+        c = chip.Chip(propagation, table_max_inputs = 0)
+        name = circuits.build_ripple_adder(c, bits)
+        operation = c.chips[name]().operation
+        _, seconds = timed(lambda: [operation(*v) for v in stimulus])
+        print('{0} {1:>10} operation: {2:10.0f} vectors/s'.format(
+            name, propagation, vectors / seconds))
+    compiled = c.chips[name]().netlist
+    flat = codegen.compile_netlist(compiled)
+    shared = codegen.compile_definition(
+        c.definitions[compiled.structure_key()])
+    words = [[rng.getrandbits(width) for _ in compiled.inputs]
+             for _ in range(vectors)]
+    mask = (1 << width) - 1
+    for label, run in [
+            ('evaluate_packed', lambda w: compiled.evaluate_packed(w, width)),
+            ('generated flat', lambda w: flat(w, mask)),
+            ('generated shared', lambda w: shared(w, mask))]:
+        _, seconds = timed(lambda: [run(w) for w in words])
+        print('{0} {1:>16} x {2}: {3:10.0f} vectors/s'.format(
+            name, label, width, vectors * width / seconds))
+    # Generated code grows with the instances when flattened and with the
+    # distinct chips when sub-chips are shared
+    for size in [100, 1000]:
+        c = chip.Chip('compiled', table_max_inputs = 0)
+        name = circuits.build_ripple_adder(c, size)
+        compiled = c.chips[name]().netlist
+        definitions = {}
+        pending = [c.definitions[compiled.structure_key()]]
+        while pending:
+            definition = pending.pop()
+            if definition.key not in definitions:
+                definitions[definition.key] = definition
+                pending.extend(child for child, _, _ in definition.instances
+                               if isinstance(child, codegen.Definition))
+        shared_lines = sum(
+            codegen.generate_definition_source(d, 'f').count('\n')
+            for d in definitions.values())
+        print('{0}: generated lines flat {1}, shared {2} in {3} '
+              'functions'.format(name,
+                                 codegen.generate_source(compiled).count('\n'),
+                                 shared_lines, len(definitions)))
+
+def bench_faults(bits=32, vectors=1000):
+    """Time grading random vectors on a bits-wide comparator.
+
+    Random vectors rarely make the operands of a comparator equal, so most
+    faults are never detected and every vector simulates them.  Width 1
+    simulates one vector at a time; wider words pack the vectors.
+    """
+    rng = random.Random(0)
+    c = chip.Chip()
+    name = circuits.build_comparator(c, bits, bits)
+    compiled = c.chips[name]().netlist
+    stimulus = [[rng.randint(0, 1) for _ in compiled.inputs]
+                for _ in range(vectors)]
+    for width in [1, 64, 1024]:
+        result, seconds = timed(faults.simulate_faults, compiled, stimulus,
+                                None, width)
+        print('{0} faults, width {1:4}: {2:7.3f}s, {3} faults, '
+              '{4:.1%} coverage'.format(name, width, seconds,
+                                        len(result.faults), result.coverage))
+
+def bench_stimulus(bits=8):
+    """Time every vector of a bits-wide adder from each stimulus source.
+
+    Counting in binary changes about two pins per vector and Gray code one,
+    so the incremental runs evaluate small fan-out cones; the packed run
+    evaluates whole chunks at once.
+    """
+    c = chip.Chip()
+    name = circuits.build_ripple_adder(c, bits)
+    compiled = c.chips[name]().netlist
+    n = len(compiled.inputs)
+    runs = [('packed exhaustive', stimulus.simulate, stimulus.Exhaustive),
+            ('incremental exhaustive', stimulus.simulate_incremental,
+             stimulus.Exhaustive),
+            ('incremental gray code', stimulus.simulate_incremental,
+             stimulus.GrayCode)]
+    for label, simulate, source in runs:
+        _, seconds = timed(lambda: sum(1 for _ in simulate(compiled,
+                                                           source(n))))
+        print('{0} {1:<22}: {2:10.0f} vectors/s'.format(
+            name, label, (1 << n) / seconds))
+
+def bench_fourstate(bits=64, width=64, rounds=200):
+    """Compare four-valued evaluation of an adder with binary evaluation."""
+    rng = random.Random(0)
+    c = chip.Chip()
+    name = circuits.build_ripple_adder(c, bits)
+    compiled = c.chips[name]().netlist
+    mask = (1 << width) - 1
+    words = [rng.getrandbits(width) for _ in compiled.inputs]
+    # The same vectors with a quarter of the pins X
+    unknown = [rng.getrandbits(width) & rng.getrandbits(width)
+               for _ in compiled.inputs]
+    highs = [word | x for word, x in zip(words, unknown)]
+    lows = [word ^ mask | x for word, x in zip(words, unknown)]
+    values = [0] * compiled.n_nets
+    state = fourstate.new_state(compiled, width)
+    _, binary = timed(lambda: [compiled.evaluate_packed(words, width, values)
+                               for _ in range(rounds)])
+    _, four = timed(lambda: [fourstate.evaluate_packed(compiled, highs, lows,
+                                                       width, state)
+                             for _ in range(rounds)])
+    print('{0} x {1}: binary {2:8.1f} us, four-valued {3:8.1f} us, '
+          '{4:.2f}x'.format(name, width, binary / rounds * 1e6,
+                            four / rounds * 1e6, four / binary))
+
+def bench_build(sizes=(1000, 10000, 100000)):
+    """Time building flat chains of inverters through the Chip API.
+
+    Every gate is added and wired with add_gate and connect_out_in and the
+    chain made in one make_chip_from_gates call; pin bookkeeping is hashed,
+    so the time per gate should stay flat as the chain grows.
+    """
+    for size in sizes:
+        c = chip.Chip()
+        _, seconds = timed(circuits.build_chain, c, 'chain', 'not_chip', size)
+        print('flat chain of {0:>6} gates: build {1:7.3f}s, {2:6.1f} '
+              'us/gate'.format(size, seconds, seconds / size * 1e6))
+
+def bench_session(bits=64, flips=2000):
+    """Time flipping single input bits of a bits-wide adder in a Session.
+
+    Flipping the carry input reaches the whole carry chain and the top bit
+    of b only the last adder, against a full evaluation per vector.
+    """
+    c = chip.Chip()
+    name = circuits.build_ripple_adder(c, bits)
+    compiled = c.chips[name]().netlist
+    n = len(compiled.inputs)
+    _, seconds = timed(lambda: [compiled.evaluate([k & 1] * n)
+                                for k in range(flips)])
+    print('{0} full evaluation: {1:9.1f} us/vector, {2} gates'.format(
+        name, seconds / flips * 1e6, compiled.n_gates))
+    for label, pin in [('carry in', 0), ('top bit of b', n - 1)]:
+        s = session.Session(compiled)
+        _, seconds = timed(lambda: [s.set_inputs({pin: k & 1})
+                                    for k in range(flips)])
+        print('{0} flip {1:<12}: {2:9.1f} us/flip, {3} gates in cone'.format(
+            name, label, seconds / flips * 1e6,
+            len(compiled.fanout_cone(compiled.inputs[pin]))))
+
+def bench_redraw(gate_counts=(10, 100, 400), clicks=20):
+    """Time redrawing the editor after a click against the gates on screen.
+
+    A click here toggles the Add Gate highlight.  Clearing the canvas and
+    drawing everything again, as the editor used to, is compared with a
+    retained-mode View.  Needs a display; skipped without one.
+    """
+    import graphics
+    try:
+        canvas = graphics.Canvas(width = 600, height = 768)
+    except Exception as e:
+        print('Redraw benchmark skipped:', e)
+        return
+    def flush():
+        # Have Tk render the changes, as waiting for the next click does
+        canvas._canvas.update()
+    for count in gate_counts:
+        c = chip.Chip()
+        for n in range(count):
+            c.add_gate(c.chips['and_chip'](),
+                       (150 + n % 20 * 20, 150 + n // 20 * 30))
+        parameters = types.SimpleNamespace(
+            chip = c, lines = [], selected_chip = None, add_chip = False,
+            selected_remove_gate = False, start_connect = [])
+
+        def redraw_all():
+            canvas.clear()
+            for gate in c.gates:
+                gate.draw(canvas)
+            c.draw(canvas)
+            if parameters.add_chip:
+                canvas.draw_polygon(graphics.rectangle_points(
+                    (300-3, 20-3), 56, 21), filled = 0)
+            flush()
+        def click(redraw):
+            for _ in range(clicks):
+                parameters.add_chip = not parameters.add_chip
+                redraw()
+
+        _, cleared = timed(click, redraw_all)
+        canvas.clear()
+        screen = view.View(canvas, [])
+        screen.update(parameters)
+        _, retained = timed(click, lambda: (screen.update(parameters),
+                                            flush()))
+        canvas.clear()
+        print('{0:>5} gates: redraw all {1:8.2f} ms/click, retained '
+              '{2:8.2f} ms/click'.format(count, cleared / clicks * 1e3,
+                                          retained / clicks * 1e3))
+
+# Each family of the suite: its builder, the sizes it is built at and the
+# Chip options; inverter chains are not optimized, which would remove them
+SUITE = [
+    ('ripple_adder', circuits.build_ripple_adder, [10, 100, 1000], {}),
+    ('array_multiplier', circuits.build_array_multiplier, [4, 8, 16, 32],
+     {}),
+    ('comparator', circuits.build_comparator, [10, 100, 1000], {}),
+    ('mux_tree', circuits.build_mux_tree, [2, 4, 6, 8], {}),
+    ('inverter_chain', circuits.build_inverter_chain, [100, 1000, 10000],
+     {'optimize': False}),
+]
+
+# Results that get worse as they grow; the rest get worse as they shrink
+LOWER_IS_BETTER = ['build_seconds', 'peak_bytes']
+
+def bench_circuit(family, build, size, options, vectors=4096,
+                  min_seconds=0.05):
+    """Return the measurements of one circuit of the suite as a dict.
+
+    Batches of vectors random input vectors are evaluated bit-parallel for
+    at least min_seconds; gate_evals_per_second counts one evaluation per
+    gate and vector.  The peak memory of building the circuit and
+    simulating one batch is measured in a second run, since tracing
+    allocations slows both down.  deduplicated is the fraction of the
+    flattened gates that repeat a sub-chip definition, see Chip.dedup_stats.
+    """
+    def run(min_seconds):
+        c = chip.Chip(table_max_inputs = 0, **options)
+        name, build_time = timed(build, c, size)
+        compiled = c.chips[name]().netlist
+        rng = random.Random(0)
+        words = [rng.getrandbits(vectors) for _ in compiled.inputs]
+        batches, start = 0, time.perf_counter()
+        while True:
+            compiled.evaluate_packed(words, vectors)
+            batches += 1
+            run_time = time.perf_counter() - start
+            if run_time >= min_seconds:
+                return (compiled, build_time, batches * vectors / run_time,
+                        c.dedup_stats(name)['deduplicated'])
+    compiled, build_time, rate, deduplicated = run(min_seconds)
+    tracemalloc.start()
+    run(0)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'family': family, 'size': size, 'gates': compiled.n_gates,
+            'depth': compiled.depth, 'inputs': len(compiled.inputs),
+            'build_seconds': build_time, 'vectors_per_second': rate,
+            'gate_evals_per_second': rate * compiled.n_gates,
+            'peak_bytes': peak, 'deduplicated': deduplicated}
+
+def bench_suite(suite=SUITE):
+    """Run every circuit of suite, print a table and return the results."""
+    results = []
+    for family, build, sizes, options in suite:
+        for size in sizes:
+            result = bench_circuit(family, build, size, options)
+            results.append(result)
+            print('{family:<16} {size:>6}: {gates:>7} gates, build '
+                  '{build_seconds:7.3f}s, {vectors_per_second:10.0f} '
+                  'vectors/s, {gate_evals_per_second:12.0f} gate evals/s, '
+                  '{peak_bytes:>10} peak bytes'.format(**result))
+    return results
+
+def save_results(results, file_name):
+    """Write suite results to file_name as JSON, with the environment."""
+    with open(file_name, 'w') as f:
+        json.dump({'python': platform.python_version(),
+                   'platform': platform.platform(),
+                   'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'results': results}, f, indent = 1)
+
+def regressions(baseline, results, tolerance=0.25):
+    """Return a message for every result worse than baseline by tolerance.
+
+    baseline is the parsed JSON of an earlier run; results are matched to
+    it by family and size.
+    """
+    previous = dict(((r['family'], r['size']), r)
+                    for r in baseline['results'])
+    messages = []
+    for result in results:
+        old = previous.get((result['family'], result['size']))
+        if old is None:
+            continue
+        for key in ['build_seconds', 'vectors_per_second', 'peak_bytes']:
+            ratio = result[key] / old[key] if old[key] else 1.0
+            if key not in LOWER_IS_BETTER:
+                ratio = 1 / ratio if ratio else float('inf')
+            if ratio > 1 + tolerance:
+                messages.append('{0} {1}: {2} {3:.4g} -> {4:.4g}'.format(
+                    result['family'], result['size'], key, old[key],
+                    result[key]))
+    return messages
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the benchmarks')
+    parser.add_argument('--suite', action='store_true',
+                        help='only run the reference circuit suite')
+    parser.add_argument('--json', help='write suite results to this file')
+    parser.add_argument('--baseline',
+                        help='compare suite results to this earlier --json')
+    arguments = parser.parse_args()
+    if not arguments.suite:
+        bench_deep_chains()
+        bench_instantiation()
+        bench_representation()
+        bench_parallel()
+        bench_counter()
+        bench_codegen()
+        bench_fourstate()
+        bench_faults()
+        bench_build()
+        bench_session()
+        bench_stimulus()
+        bench_redraw()
+    results = bench_suite()
+    if arguments.json:
+        save_results(results, arguments.json)
+    if arguments.baseline:
+        with open(arguments.baseline) as f:
+            found = regressions(json.load(f), results)
+        for message in found:
+            print('Regression:', message)
+        sys.exit(1 if found else 0)
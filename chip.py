@@ -1,12 +1,58 @@
-import argparse
-import graphics
-
-parser = argparse.ArgumentParser(description='Toggle verbose mode')
-
-parser.add_argument('--verbose', '-v', action='store_true')
-arguments = parser.parse_args()
+import codegen
+import functools
+import netlist
+import optimizer
+import spatial
+import stimulus
+
+from collections import deque
+
+# Print the gates the optimizer removes from every chip; main.py sets this
+# from its --verbose flag.  Net changes are traced by the instrument module.
+verbose = False
+
+primitive_operations = {
+    netlist.AND: lambda a, b: [a and b],
+    netlist.OR: lambda a, b: [a or b],
+    netlist.NOT: lambda a: [[1, 0][a]],
+    netlist.PIPE: lambda a: [a],
+    # Storage elements as seen in the first cycle after reset
+    netlist.DFF: lambda d: [0],
+    netlist.LATCH: lambda d, enable: [d if enable else 0],
+}
+
+class Agenda(object):
+    # Queue of pending constraint messages.  Connectors schedule messages
+    # instead of calling constraints directly, so propagation through any
+    # number of gate levels runs in a loop rather than on the Python stack.
+    def __init__(self):
+        self.queue = deque()
+        self.pending = set()
+        self.running = False
+
+    def schedule(self, constraint, message):
+        if (constraint, message) not in self.pending:
+            self.pending.add((constraint, message))
+            self.queue.append((constraint, message))
+
+    def run(self):
+        # Nested calls return at once; the outermost call drains the queue
+        if self.running:
+            return
+        self.running = True
+        try:
+            while self.queue:
+                item = self.queue.popleft()
+                self.pending.discard(item)
+                getattr(item[0], item[1])()
+        finally:
+            self.running = False
+
+agenda = Agenda()
 
 class Connector(object):
+    __slots__ = ('name', 'value', 'informant', 'constraints', 'independent')
+
     def __init__(self, name = None, independent = False):
         self.name = name
         self.value = None
@@ -15,23 +61,23 @@ class Connector(object):
         self.independent = independent
 
     def set_value(self, source, value):
-        global args
+        if value == self.value:
+            # Nothing downstream can change
+            self.informant = source
+            return
         self.informant, self.value = source, value
-        if self.name is not None and arguments.verbose: 
-            print(self.name, '=', value)
         self.inform_all_except(source, 'new_val')
 
     def forget(self, source):
         if self.informant is source:
             self.informant, self.value = None, None
-            if self.name is not None:
-                print(self.name, 'is forgetten')
             self.inform_all_except(source, 'forget')
 
     def inform_all_except(self, source, message):
         for c in self.constraints:
             if c != source:
-                getattr(c, message)()
+                agenda.schedule(c, message)
+        agenda.run()
                 
     def has_value(self):
         return self.value is not None
@@ -40,6 +86,8 @@ class Connector(object):
         self.constraints.append(source)
 
 class Constraint(object):
+    __slots__ = ('connectors', 'operation')
+
     def __init__(self, values, operation):
         self.connectors = values
         self.operation = operation
@@ -55,7 +103,8 @@ class Constraint(object):
 
 class Gate(Constraint):
     # A gate has a list of inputs and outputs and an operation
-    
+    __slots__ = ('inputs', 'outputs')
+
     def __init__(self, inputs, outputs, operation):    
         self.inputs = inputs
         self.outputs = outputs
@@ -73,20 +122,55 @@ class Gate(Constraint):
             self.outputs[i].set_value(self, result[i])
 
 class Chip(object):
-    def __init__(self):
+    def __init__(self, propagation = 'levelized', table_max_inputs = 12,
+                 cache_size = None, optimize = True):
+        # propagation: 'levelized' evaluates compiled netlists directly,
+        # 'connector' drives a network of Connectors and Gates and
+        # 'compiled' runs Python code generated for each chip
+        # table_max_inputs: chips with at most this many inputs have their
+        # operation precomputed into a lookup table on first use; chips
+        # built from them are flattened into gates and do not use it
+        # cache_size: if set, larger chips keep an LRU cache of this many
+        # results of their operation
+        # optimize: remove redundant gates from every chip that is made;
+        # gates removed per pass are kept in optimization_stats
+        self.propagation = propagation
+        self.table_max_inputs = table_max_inputs
+        self.cache_size = cache_size
+        self.optimize = optimize
+        self.optimization_stats = {}
+        # Structure key of every chip, the shared Netlist and operation of
+        # every distinct structure, and the gates each chip was made from
+        self.chip_keys = {}
+        self.structures = {}
+        self.children = {}
+        # The codegen.Definition of each structure made with
+        # make_chip_from_gates, for hierarchical code generation
+        self.definitions = {}
         self.chips = {}
         self.make_starting_chips()
-        self.click_positions = {}
+        # Bounds of the placed gates and of the chip list, for clicks
+        self.gate_index = spatial.GridIndex()
+        self.library_index = spatial.GridIndex()
         self.reset()
 
     def reset(self):
         self.gates = []
-        self.connected_pins = []
+        self.gate_index.clear()
+        # Output connectors wired to some gate input, and how many gate
+        # inputs each connector drives
+        self.connected_pins = set()
+        self.fanout = {}
         self.in_name_counter = 0
         self.out_name_counter = 0
         
     class MakeChip(object):
-        def __init__(self, operation, len_inputs, len_outputs, name):
+        __slots__ = ('name', 'x', 'y', 'height', 'width', 'len_inputs',
+                     'len_outputs', 'inputs', 'outputs', 'operation',
+                     'netlist', 'state')
+
+        def __init__(self, operation, len_inputs, len_outputs, name,
+                     netlist = None):
             self.name = name
             self.x = None
             self.y = None
@@ -97,63 +181,114 @@ class Chip(object):
             self.inputs = [None for _ in range(len_inputs)]
             self.outputs = [None for _ in range(len_outputs)]
             self.operation = operation
-            self.make_gate_function = lambda inputs, outputs: Gate(inputs,
-                                                           outputs, operation)
+            # Compiled template of the chip, shared by every instance
+            self.netlist = netlist
+            # Net values of this instance, filled in by evaluate
+            self.state = bytearray(netlist.n_nets) if netlist else None
+
+        def make_gate_function(self, inputs, outputs):
+            return Gate(inputs, outputs, self.operation)
+
+        def evaluate(self, *input_list):
+            # Like operation, but evaluates into this instance's own state so
+            # the value of every net stays readable afterwards
+            return self.netlist.evaluate(input_list, self.state)
+
+        def clock(self, *input_list):
+            # Runs one clock cycle of this instance: evaluates it, then
+            # loads every dff.  Returns the outputs before the clock edge.
+            outputs = self.netlist.evaluate(input_list, self.state)
+            self.netlist.clock(self.state)
+            return outputs
+
         def draw(self, canvas):
-            # x, y are the top left coordinates
-            self.height = max(len(self.inputs), len(self.outputs)) * 15 
-            self.width = 100
-            canvas.draw_polygon(graphics.rectangle_points((self.x, self.y),
-                        self.width, self.height), fill_color = None, filled = 0)
-            canvas.draw_text(self.name, (self.x + 20, self.y))
+            # x, y are the top left coordinates.  graphics pulls in tkinter,
+            # so it is only imported once something is drawn.  Returns the
+            # ids of the items drawn, so they can be deleted later
+            import graphics
+            _, _, self.width, self.height = self.bounds()
+            items = [canvas.draw_polygon(graphics.rectangle_points(
+                        (self.x, self.y), self.width, self.height),
+                        fill_color = None, filled = 0)]
+            items.append(canvas.draw_text(self.name, (self.x + 20, self.y)))
             for i in range(len(self.inputs)):
-                canvas.draw_text('i'+str(i), (self.x + 5, self.y + 15*i))
+                items.append(canvas.draw_text('i'+str(i),
+                                              (self.x + 5, self.y + 15*i)))
 
             for j in range(len(self.outputs)):
-                canvas.draw_text('o' + str(j), (self.x + self.width - 20 ,
-                                         self.y + 15*j))
+                items.append(canvas.draw_text('o' + str(j),
+                        (self.x + self.width - 20, self.y + 15*j)))
+            return items
+
+        def bounds(self):
+            # The rectangle (x, y, width, height) the gate is drawn in
+            return (self.x, self.y, 100,
+                    max(self.len_inputs, self.len_outputs) * 15)
+
         def click_position(self, position):
             # checks to see if the click lands on the object
             # returns: index, type
             x, y = position
-            if x in range(self.x, self.x + self.width) \
-                    and y in range(self.y, self.y + self.width):
-                if x in range(self.x, self.x + 20):
+            if self.x <= x < self.x + self.width \
+                    and self.y <= y < self.y + self.height:
+                pos = int((y-self.y)/15)
+                if x < self.x + 20:
                     # Clicks input
-                    pos = int((y-self.y)/15)
-                    if pos in range(self.len_inputs):
+                    if pos < self.len_inputs:
                         return pos, 0
-                elif x in range(self.x + self.width - 20, self.x + self.width):
+                elif x >= self.x + self.width - 20:
                     # Clicks output
-                    pos = int((y-self.y)/15)
-                    if pos in range(self.len_outputs):
+                    if pos < self.len_outputs:
                         return pos, 1
             return None, None
 
-        def click_on_gate(self, position):
-            # returns true if click lands on the gate
-            x, y = position
-            if x in range(self.x, self.x + self.width) and\
-               y in range(self.y, self.y + self.height):
-                return True
-            return False
-            
-
     def make_starting_chips(self):
-        and_chip = lambda: self.MakeChip(lambda a, b: [a and b], 2, 1,
-                                         'and_chip')
-        or_chip = lambda: self.MakeChip(lambda a, b: [a or b], 2, 1, 'or_chip')
-        not_chip = lambda: self.MakeChip(lambda a: [[1, 0][a]], 1, 1, 'not_chip')
-        pipe = lambda: self.MakeChip(lambda a: [a], 1, 1, 'pipe')
-        self.chips = locals()
+        and_net = netlist.primitive(netlist.AND)
+        or_net = netlist.primitive(netlist.OR)
+        not_net = netlist.primitive(netlist.NOT)
+        pipe_net = netlist.primitive(netlist.PIPE)
+        dff_net = netlist.primitive(netlist.DFF)
+        latch_net = netlist.primitive(netlist.LATCH)
+        ops = primitive_operations
+        and_chip = lambda: self.MakeChip(ops[netlist.AND], 2, 1, 'and_chip',
+                                         and_net)
+        or_chip = lambda: self.MakeChip(ops[netlist.OR], 2, 1, 'or_chip',
+                                        or_net)
+        not_chip = lambda: self.MakeChip(ops[netlist.NOT], 1, 1, 'not_chip',
+                                         not_net)
+        pipe = lambda: self.MakeChip(ops[netlist.PIPE], 1, 1, 'pipe', pipe_net)
+        # Clocked storage: dff (d) and latch (d, enable)
+        dff = lambda: self.MakeChip(ops[netlist.DFF], 1, 1, 'dff', dff_net)
+        latch = lambda: self.MakeChip(ops[netlist.LATCH], 2, 1, 'latch',
+                                      latch_net)
+        self.chips = {'and_chip': and_chip, 'or_chip': or_chip,
+                      'not_chip': not_chip, 'pipe': pipe, 'dff': dff,
+                      'latch': latch}
 
     def simulate_chip(self, chip, inputs):
         # chip is an item in the chips dictionary
         print(inputs, chip().operation(*inputs))
+
+    def simulate_batch(self, chip, inputs_array):
+        # Returns the outputs of chip for every row of inputs_array, an
+        # (N, len_inputs) NumPy array of 0/1 values, as an (N, len_outputs)
+        # uint8 array.  Requires numpy.
+        return chip().netlist.evaluate_array(inputs_array)
+
+    def simulate_all(self, chip, chunk_bits = 16):
+        # Returns an iterator of (inputs, outputs) for every input
+        # combination of chip, in binary counting order.  Each pass through
+        # the netlist evaluates 2**chunk_bits combinations packed bitwise
+        # into Python ints, as in stimulus.simulate.
+        compiled = chip().netlist
+        source = stimulus.Exhaustive(len(compiled.inputs))
+        return stimulus.simulate(compiled, source, 1 << chunk_bits)
     
     def add_gate(self, gate, pos = None):
         if pos is not None:
             gate.x, gate.y = pos
+            _, _, gate.width, gate.height = gate.bounds()
+            self.gate_index.insert(gate, gate.bounds())
         for i in range(gate.len_inputs):
             self.in_name_counter += 1
             c = Connector('in'+str(self.in_name_counter), True)
@@ -165,6 +300,24 @@ class Chip(object):
             gate.outputs[i] = c
         self.gates.append(gate)
     
+    def remove_gate(self, gate):
+        # Removes gate and forgets the connections made to its pins
+        self.gates.remove(gate)
+        self.gate_index.remove(gate)
+        for pin in gate.inputs:
+            if pin in self.fanout:
+                self.fanout[pin] -= 1
+                if not self.fanout[pin]:
+                    del self.fanout[pin]
+                    self.connected_pins.discard(pin)
+        for pin in gate.outputs:
+            self.fanout.pop(pin, None)
+            self.connected_pins.discard(pin)
+
+    def gates_at(self, pos):
+        # Returns the placed gates whose rectangle contains pos
+        return self.gate_index.query(pos)
+
     def connect_gates(self, gate1, gate2):
         # format: gate1 = [gate, pin_no., pin_type]
         # pin_type: 0 is input, 1 is output
@@ -180,10 +333,11 @@ class Chip(object):
                 #g2 input, g1 output
                 pin = g1.outputs[pin1]
                 g2.inputs[pin2] = pin
-            if pin not in self.connected_pins:
-                self.connected_pins.append(pin)
+            self.add_reader(pin)
         elif type1 + type2 == 0:
             g1.inputs[pin1] = g2.inputs[pin2]
+            if g2.inputs[pin2] in self.fanout:
+                self.add_reader(g2.inputs[pin2])
         else:
             print("Cannot connect two outputs to each other!")
             return True
@@ -193,15 +347,21 @@ class Chip(object):
     def connect_out_in(self, output_gate, output_pin, input_gate, input_pin):
         pin = output_gate.outputs[output_pin]
         input_gate.inputs[input_pin] = pin
-        
-        if pin not in self.connected_pins:
-            self.connected_pins.append(pin)
+        self.add_reader(pin)
+
+    def add_reader(self, pin):
+        # Records one more gate input driven by the output connector pin
+        self.connected_pins.add(pin)
+        self.fanout[pin] = self.fanout.get(pin, 0) + 1
 
     def connect_in_in(self, in_gate1, in_pin1, in_gate2, in_pin2):
         pin = in_gate2.inputs[in_pin2]
         in_gate1.inputs[in_pin1] = pin
+        if pin in self.fanout:
+            self.add_reader(pin)
 
-    def make_chip_from_gates(self, chip_name):
+    def make_chip_from_gates(self, chip_name, cache_size = None):
+        # cache_size overrides self.cache_size for this chip
         if chip_name in self.chips:
             print('Name already used!!')
             return  
@@ -209,197 +369,225 @@ class Chip(object):
         f_connected_pins = self.connected_pins
         inputs = []
         outputs = []
+        # Pins already in inputs or outputs
+        seen = set()
         for gate in f_gates:
             for i in gate.inputs:
-                if i not in f_connected_pins:
-                    if i not in inputs:
-                        inputs.append(i)
+                if i not in f_connected_pins and i not in seen:
+                    seen.add(i)
+                    inputs.append(i)
             for i in gate.outputs:
-                if i not in f_connected_pins:
-                    if i not in outputs:
-                        outputs.append(i)
-            gate.make_gate_function(gate.inputs, gate.outputs)
-        """
-        print(inputs)
-        print(outputs)
-        print(f_connected_pins)
-        print(len(outputs), len(inputs))
-        """
-        def func():        
+                if i not in f_connected_pins and i not in seen:
+                    seen.add(i)
+                    outputs.append(i)
+        try:
+            compiled, definition = self.compile_gates(f_gates, inputs,
+                                                      outputs)
+        except ValueError as e:
+            print(e)
+            return
+        if self.optimize:
+            compiled, stats = optimizer.optimize(compiled)
+            self.optimization_stats[chip_name] = stats
+            if verbose:
+                print(chip_name, 'gates removed:', stats)
+        children = {}
+        for gate in f_gates:
+            children[gate.name] = children.get(gate.name, 0) + 1
+        self.children[chip_name] = children
+        definition.key = compiled.structure_key()
+        self.definitions.setdefault(definition.key, definition)
+        self.add_compiled_chip(chip_name, compiled, cache_size)
+        if verbose:
+            print(chip_name, 'deduplication:', self.dedup_stats(chip_name))
+        self.reset()
+
+    def add_compiled_chip(self, chip_name, compiled, cache_size = None):
+        # Adds chip_name to the chips dictionary, built from a Netlist.
+        # Chips with the same structure as an earlier one share its Netlist
+        # and operation, and with them its table, cache or connectors
+        if cache_size is None:
+            cache_size = self.cache_size
+        key = compiled.structure_key()
+        self.chip_keys[chip_name] = key
+        shared = self.structures.get((key, cache_size))
+        if shared is not None:
+            self.add_chip_function(chip_name, *shared)
+            return
+        len_inputs, len_outputs = len(compiled.inputs), len(compiled.outputs)
+        # Chips with storage are not pure functions of their inputs; their
+        # operation gives the first cycle after reset, see MakeChip.clock
+        sequential = compiled.sequential
+        if len_inputs <= self.table_max_inputs and not sequential:
+            operation = self.table_operation(compiled)
+        elif self.propagation == 'connector' and not sequential:
+            operation = self.connector_operation(compiled)
+        elif self.propagation == 'compiled' and not sequential:
+            # Chips made here keep their sub-chips as shared functions;
+            # loaded chips, and sub-chips wired into a loop, run flattened
+            function = None
+            if key in self.definitions:
+                try:
+                    function = codegen.compile_definition(
+                        self.definitions[key])
+                except ValueError:
+                    pass
+            if function is None:
+                function = codegen.compile_netlist(compiled)
             def operation(*input_list):
-                for i in range(len(input_list)): 
-                    inputs[i].set_value('chip', input_list[i])
-                output_list = [output.value for output in outputs]
-                return output_list
-            return self.MakeChip(operation, len(inputs), len(outputs), chip_name)
-        self.gates = []
-        self.connected_pins = []
-        self.in_name_counter = 0
-        self.out_name_counter = 0
+                return function(input_list)
+        else:
+            def operation(*input_list):
+                return compiled.evaluate(input_list)
+        if cache_size and len_inputs > self.table_max_inputs \
+                and not sequential:
+            operation = self.cached_operation(operation, cache_size)
+        self.structures[key, cache_size] = (compiled, operation)
+        self.add_chip_function(chip_name, compiled, operation)
+
+    def dedup_stats(self, chip_name):
+        # Measures how much of chip_name repeats the same definitions, in
+        # primitive gates:
+        # instances: chips used at every level of its hierarchy
+        # distinct: distinct structures among them
+        # flat_gates: primitive gates once flattened, before optimization
+        # unique_gates: primitive gates written once per distinct structure,
+        # the primitives placed directly in the definition of chip_name and
+        # of each distinct chip made of other chips inside it
+        # deduplicated: the fraction of flat_gates that are repeats
+        # Chips loaded from a library, whose hierarchy is unknown, count as
+        # definitions of their compiled gates
+        expanded = {}
+        def expand(name):
+            # Instances of every chip at every level inside name
+            if name not in expanded:
+                counts = {}
+                for child, n in self.children.get(name, {}).items():
+                    counts[child] = counts.get(child, 0) + n
+                    for sub, m in expand(child).items():
+                        counts[sub] = counts.get(sub, 0) + n * m
+                expanded[name] = counts
+            return expanded[name]
+        def direct(name):
+            # Primitive gates written in the definition of name itself
+            if name in self.children:
+                return sum(n for child, n in self.children[name].items()
+                           if child in netlist.OPCODE_NAMES)
+            return self.chips[name]().netlist.n_gates
+        counts = expand(chip_name)
+        flat_gates = direct(chip_name) + sum(
+            n * direct(name) for name, n in counts.items()
+            if name not in netlist.OPCODE_NAMES)
+        definitions = {}
+        for name in list(counts) + [chip_name]:
+            if name not in netlist.OPCODE_NAMES:
+                definitions[self.chip_keys.get(name, name)] = direct(name)
+        unique_gates = sum(definitions.values())
+        return {'instances': sum(counts.values()),
+                'distinct': len(set(self.chip_keys.get(name, name)
+                                    for name in counts)),
+                'flat_gates': flat_gates, 'unique_gates': unique_gates,
+                'deduplicated': 1 - unique_gates / flat_gates
+                if flat_gates else 0.0}
+
+    def add_chip_function(self, chip_name, compiled, operation):
+        # Adds the function that makes instances of chip_name
+        len_inputs, len_outputs = len(compiled.inputs), len(compiled.outputs)
+        def func():
+            return self.MakeChip(operation, len_inputs, len_outputs,
+                                 chip_name, compiled)
         self.chips[chip_name] = func
-        
+
+    def compile_gates(self, gates, inputs, outputs):
+        # Flattens gates into a levelized netlist of primitive gates, and
+        # returns it with the codegen.Definition of the same nets as
+        # instances of the gates, whose key is left for the caller to set
+        # inputs, outputs: the connectors that become the chip's pins
+        builder = netlist.NetlistBuilder()
+        nets = {}
+        def net(connector):
+            if connector not in nets:
+                nets[connector] = builder.add_net(connector.name)
+            return nets[connector]
+        for i in inputs:
+            net(i)
+        instances = []
+        for gate in gates:
+            input_nets = [net(i) for i in gate.inputs]
+            output_nets = [net(o) for o in gate.outputs]
+            builder.inline(gate.netlist, input_nets, output_nets)
+            child = self.definitions.get(gate.netlist.structure_key(),
+                                         gate.netlist)
+            instances.append((child, input_nets, output_nets))
+        input_nets = [net(i) for i in inputs]
+        output_nets = [net(o) for o in outputs]
+        return (builder.build(input_nets, output_nets),
+                codegen.Definition(None, input_nets, output_nets, instances))
+
+    def table_operation(self, compiled):
+        # Precomputes every output of compiled, on first use, so that the
+        # operation is a single lookup.  Only direct calls of the operation
+        # use the table; a chip that contains this one flattens its gates
+        table = []
+        def operation(*input_list):
+            assert len(input_list) == len(compiled.inputs), \
+                'Expected {0} inputs'.format(len(compiled.inputs))
+            if not table:
+                table.extend(compiled.truth_table())
+            index = 0
+            for value in input_list:
+                index = index << 1 | (1 if value else 0)
+            return list(table[index])
+        return operation
+
+    def cached_operation(self, operation, cache_size):
+        # Wraps operation in an LRU cache holding at most cache_size results;
+        # hits and misses are reported by operation.cache_info()
+        @functools.lru_cache(maxsize = cache_size)
+        def lookup(input_tuple):
+            return tuple(operation(*input_tuple))
+        def cached(*input_list):
+            return list(lookup(tuple(input_list)))
+        cached.cache_info = lookup.cache_info
+        cached.cache_clear = lookup.cache_clear
+        return cached
+
+    def connector_operation(self, compiled):
+        # Builds a Connector for every net and a Gate for every primitive of
+        # compiled, and returns an operation that drives them.  Propagation
+        # runs from the agenda and only re-fires gates whose inputs change.
+        connectors = [Connector(compiled.names.get(net))
+                      for net in range(compiled.n_nets)]
+        for op, ins, out in compiled.gates:
+            if op in (netlist.CONST0, netlist.CONST1):
+                value = 1 if op == netlist.CONST1 else 0
+                connectors[out].set_value('constant', value)
+            else:
+                Gate([connectors[i] for i in ins], [connectors[out]],
+                     primitive_operations[op])
+        inputs = [connectors[i] for i in compiled.inputs]
+        outputs = [connectors[o] for o in compiled.outputs]
+        def operation(*input_list):
+            for i in range(len(input_list)):
+                inputs[i].set_value('chip', input_list[i])
+            return [output.value for output in outputs]
+        return operation
+
     def draw(self, canvas):
+        # Draws the list of chips and returns the ids of the items drawn
         counter = 0
+        items = []
+        self.library_index.clear()
         for chip_name, chip_object in self.chips.items():
             if chip_object is not self:
-                canvas.draw_text(chip_name, (20, 20 + counter * 15))
-                self.click_positions[chip_name] = (20, 15 + counter * 15)
+                items.append(canvas.draw_text(chip_name,
+                                              (20, 20 + counter * 15)))
+                self.library_index.insert(chip_name,
+                                          (20, 20 + counter * 15, 50, 15))
                 counter += 1
+        return items
         
     def click_on_chip(self, pos):
         # returns the chip that is clicked, returns None if no chip is clicked
-        x, y = pos
-        for name, position in self.click_positions.items():
-            xp, yp = position
-            if x in range(xp, xp + 50) and y in range(yp + 5, yp + 20):
-                return name
-        return None
-
-"""
-c = Chip()
-
-#########
-#  XOR  #
-#########
-
-c.add_gate(c.chips['and_chip']())
-c.add_gate(c.chips['and_chip']())
-c.add_gate(c.chips['not_chip']())
-c.add_gate(c.chips['not_chip']())
-c.add_gate(c.chips['or_chip']())
-
-ag1 = c.gates[0]
-ag2 = c.gates[1]
-ng1 = c.gates[2]
-ng2 = c.gates[3]
-og1 = c.gates[4]
-
-c.connect_out_in(ng1, 0, ag1, 0)
-c.connect_out_in(ng2, 0, ag2, 1)
-c.connect_out_in(ag1, 0, og1, 0)
-c.connect_out_in(ag2, 0, og1, 1)
-
-c.connect_in_in(ag1, 1, ng2, 0)
-c.connect_in_in(ag2, 0, ng1, 0)
-
-c.make_chip_from_gates('xor')
-
-c.simulate_chip(c.chips['xor'], [0,0])
-c.simulate_chip(c.chips['xor'], [1,0])
-c.simulate_chip(c.chips['xor'], [0,1])
-c.simulate_chip(c.chips['xor'], [1,1])
-
-"""
-"""
-#########
-#HALFADD#
-#########
-
-c.add_gate(c.chips['xor']())
-c.add_gate(c.chips['and_chip']())
-
-ag = c.gates[1]
-xg = c.gates[0]
-
-c.connect_in_in(ag, 0, xg, 0)
-c.connect_in_in(ag, 1, xg, 1)
-
-c.make_chip_from_gates('half_adder')
-# returns [sum, carry]
-
-#c.simulate_chip(c.chips['half_adder'], [0,0])
-#c.simulate_chip(c.chips['half_adder'], [0,1])
-#c.simulate_chip(c.chips['half_adder'], [1,0])
-#c.simulate_chip(c.chips['half_adder'], [1,1])
-
-#########
-#FULLADD#
-#########
-
-c.add_gate(c.chips['and_chip']())
-c.add_gate(c.chips['and_chip']())
-c.add_gate(c.chips['xor']())
-c.add_gate(c.chips['xor']())
-c.add_gate(c.chips['or_chip']())
-
-ag1 = c.gates[0]
-ag2 = c.gates[1]
-xg1 = c.gates[2]
-xg2 = c.gates[3]
-og1 = c.gates[4]
-
-c.connect_out_in(xg1, 0, xg2, 0)
-c.connect_out_in(xg1, 0, ag1, 0)
-c.connect_out_in(ag1, 0, og1, 0)
-c.connect_out_in(ag2, 0, og1, 1)
-
-c.connect_in_in(ag2, 1, xg1, 1)
-c.connect_in_in(ag2, 0, xg1, 0)
-c.connect_in_in(ag1, 1, xg2, 1)
-
-c.make_chip_from_gates('full_adder')
-# returns [sum, carry]
-
-#c.simulate_chip(c.chips['full_adder'], [0,0,0])
-#c.simulate_chip(c.chips['full_adder'], [0,0,1])
-#c.simulate_chip(c.chips['full_adder'], [0,1,0])
-#c.simulate_chip(c.chips['full_adder'], [0,1,1])
-#c.simulate_chip(c.chips['full_adder'], [1,0,0])
-#c.simulate_chip(c.chips['full_adder'], [1,0,1])
-#c.simulate_chip(c.chips['full_adder'], [1,1,0])
-#c.simulate_chip(c.chips['full_adder'], [1,1,1])
-
-#########
-#8BITADD#
-#########
-
-c.add_gate(c.chips['half_adder']())
-for _ in range(7):
-    c.add_gate(c.chips['full_adder']())
-
-a = [c.gates[i] for i in range(8)]
-
-for n in range(7):
-    c.connect_out_in(a[n], 1, a[n+1], 0)
-
-c.make_chip_from_gates('8-bit_adder')
-
-combine_2_lists = lambda a, b: [(a, b)[i][j] for j in range(len(a))
-                                             for i in (0, 1) ]
-
-def list_to_bin(l):
-    s = 0
-    for i in range(len(l)):
-        s += l[i] * pow(2, i)
-    return s
-l1 = [1,1,0,1,1,1,0,1]
-l2 = [1,0,1,1,0,1,1,1]
-
-_, answer = c.simulate_chip(c.chips['8-bit_adder'], combine_2_lists(l1, l2))
-                            
-print(list_to_bin(l1), '+', list_to_bin(l2), '=', list_to_bin(answer))
-"""
-
-
-"""
-c.add_gate(c.chips['and_chip']())
-c.add_gate(c.chips['and_chip']())
-c.add_gate(c.chips['not_chip']())
-ag1 = c.gates[0]
-ag2 = c.gates[1]
-ng = c.gates[2]
-c.connect_gates([ag1, 0, 1], [ag2, 0, 0])
-c.connect_gates([ag2, 0, 1], [ng, 0, 0])
-c.make_chip_from_gates('triple_nand')
-
-
-c.add_gate(c.chips['triple_nand']())
-c.add_gate(c.chips['triple_nand']())
-
-ta1 = c.gates[0]
-ta2 = c.gates[1]
-
-c.connect_gates([ta1, 0, 1], [ta2, 0, 0])
-c.make_chip_from_gates('double_triple_nand')
-c.simulate_chip(c.chips['double_triple_nand'], [1, 1, 0, 1, 1])
-"""
+        found = self.library_index.query(pos)
+        return found[0] if found else None
@@ -0,0 +1,274 @@
+"""The circuits module builds reference chips through the Chip API.
+
+Every builder adds gates with Chip.add_gate, wires them with connect_out_in
+and connect_in_in and registers the result with make_chip_from_gates, exactly
+as a design entered in the editor would be.  Builders return the name of the
+chip they made and skip chips that already exist.
+"""
+
+def build_xor(c):
+    """Build xor from and/or/not gates: inputs [a, b], outputs [a ^ b]."""
+    if 'xor' in c.chips:
+        return 'xor'
+    for name in ['and_chip', 'and_chip', 'not_chip', 'not_chip', 'or_chip']:
+        c.add_gate(c.chips[name]())
+    ag1, ag2, ng1, ng2, og1 = c.gates
+
+    c.connect_out_in(ng1, 0, ag1, 0)
+    c.connect_out_in(ng2, 0, ag2, 1)
+    c.connect_out_in(ag1, 0, og1, 0)
+    c.connect_out_in(ag2, 0, og1, 1)
+
+    c.connect_in_in(ag1, 1, ng2, 0)
+    c.connect_in_in(ag2, 0, ng1, 0)
+
+    c.make_chip_from_gates('xor')
+    return 'xor'
+
+def build_half_adder(c):
+    """Build half_adder: inputs [a, b], outputs [sum, carry]."""
+    if 'half_adder' in c.chips:
+        return 'half_adder'
+    build_xor(c)
+    c.add_gate(c.chips['xor']())
+    c.add_gate(c.chips['and_chip']())
+    xg, ag = c.gates
+
+    c.connect_in_in(ag, 0, xg, 0)
+    c.connect_in_in(ag, 1, xg, 1)
+
+    c.make_chip_from_gates('half_adder')
+    return 'half_adder'
+
+def build_full_adder(c):
+    """Build full_adder: inputs [carry, a, b], outputs [sum, carry]."""
+    if 'full_adder' in c.chips:
+        return 'full_adder'
+    build_xor(c)
+    for name in ['and_chip', 'and_chip', 'xor', 'xor', 'or_chip']:
+        c.add_gate(c.chips[name]())
+    ag1, ag2, xg1, xg2, og1 = c.gates
+
+    c.connect_out_in(xg1, 0, xg2, 0)
+    c.connect_out_in(xg1, 0, ag1, 0)
+    c.connect_out_in(ag1, 0, og1, 0)
+    c.connect_out_in(ag2, 0, og1, 1)
+
+    c.connect_in_in(ag2, 1, xg1, 1)
+    c.connect_in_in(ag2, 0, xg1, 0)
+    c.connect_in_in(ag1, 1, xg2, 1)
+
+    c.make_chip_from_gates('full_adder')
+    return 'full_adder'
+
+def build_chain(c, name, unit, count, out_pin=0, in_pin=0, links=1):
+    """Build name from count copies of unit, each feeding the next.
+
+    Outputs out_pin to out_pin + links - 1 of every copy drive inputs in_pin
+    to in_pin + links - 1 of the copy after it.
+    """
+    if name in c.chips:
+        return name
+    for _ in range(count):
+        c.add_gate(c.chips[unit]())
+    gates = list(c.gates)
+    for n in range(count - 1):
+        for k in range(links):
+            c.connect_out_in(gates[n], out_pin + k, gates[n + 1], in_pin + k)
+    c.make_chip_from_gates(name)
+    return name
+
+def build_inverter_chain(c, length, block=100):
+    """Build a chain of length inverters out of chains of block inverters."""
+    name = 'not_chain_' + str(length)
+    if length <= block:
+        return build_chain(c, name, 'not_chip', length)
+    assert length % block == 0, 'Long chains must be a multiple of block'
+    unit = build_inverter_chain(c, block, block)
+    return build_chain(c, name, unit, length // block)
+
+def build_ripple_adder(c, bits, block=100):
+    """Build a bits-wide ripple-carry adder out of full_adder chips.
+
+    Inputs are [carry, a0, b0, a1, b1, ...] and outputs are
+    [s0, s1, ..., carry], with bit 0 the least significant.
+    """
+    name = 'adder_' + str(bits)
+    build_full_adder(c)
+    if bits <= block:
+        return build_chain(c, name, 'full_adder', bits, 1, 0)
+    assert bits % block == 0, 'Wide adders must be a multiple of block'
+    unit = build_ripple_adder(c, block, block)
+    return build_chain(c, name, unit, bits // block, block, 0)
+
+def add_gates(c, name, count):
+    """Add count gates of chip name to c and return them."""
+    for _ in range(count):
+        c.add_gate(c.chips[name]())
+    return c.gates[-count:]
+
+def build_array_multiplier(c, bits):
+    """Build a bits x bits array multiplier out of and gates and adders.
+
+    Inputs are [a0, a1, ..., b0, b1, ...] and outputs are the 2 * bits
+    product bits [p0, p1, ...], with bit 0 the least significant.  Row i adds
+    the partial products a_i & b_j to the running sum with a ripple of half
+    and full adders.
+    """
+    assert bits > 1, 'Multipliers must be at least 2 bits wide'
+    name = 'multiplier_' + str(bits)
+    if name in c.chips:
+        return name
+    build_half_adder(c)
+    build_full_adder(c)
+    # Pipes first, so that they hold the input pins in order
+    a, b = add_gates(c, 'pipe', bits), add_gates(c, 'pipe', bits)
+    partial = []
+    for i in range(bits):
+        row = add_gates(c, 'and_chip', bits)
+        for j, gate in enumerate(row):
+            c.connect_out_in(a[i], 0, gate, 0)
+            c.connect_out_in(b[j], 0, gate, 1)
+        partial.append([(gate, 0) for gate in row])
+
+    def add_bits(x, y):
+        # Ripple-add the little-endian (gate, pin) lists x and y
+        total, carry = [], None
+        for k in range(max(len(x), len(y))):
+            operands = x[k:k + 1] + y[k:k + 1]
+            if carry is not None:
+                operands.append(carry)
+            if len(operands) == 1:
+                total.append(operands[0])
+                continue
+            if len(operands) == 3:
+                # A full_adder takes the carry on its first pin
+                operands = operands[-1:] + operands[:-1]
+            adder, = add_gates(c, 'full_adder' if len(operands) == 3
+                               else 'half_adder', 1)
+            for pin, (gate, out_pin) in enumerate(operands):
+                c.connect_out_in(gate, out_pin, adder, pin)
+            total.append((adder, 0))
+            carry = (adder, 1)
+        if carry is not None:
+            total.append(carry)
+        return total
+
+    product, running = [], partial[0]
+    for i in range(1, bits):
+        product.append(running[0])
+        running = add_bits(partial[i], running[1:])
+    for gate, out_pin in product + running:
+        tap, = add_gates(c, 'pipe', 1)
+        c.connect_out_in(gate, out_pin, tap, 0)
+    c.make_chip_from_gates(name)
+    return name
+
+def build_comparator_cell(c):
+    """Build comparator_cell: inputs [lt, eq, a, b], outputs [lt, eq].
+
+    The outputs compare a bit and the bits below it: eq is (a == b) & eq,
+    and lt is (a < b) | ((a == b) & lt).
+    """
+    if 'comparator_cell' in c.chips:
+        return 'comparator_cell'
+    build_xor(c)
+    for name in ['or_chip', 'and_chip', 'and_chip', 'xor', 'not_chip',
+                 'not_chip', 'and_chip']:
+        c.add_gate(c.chips[name]())
+    og, ag1, ag2, xg, ng1, ng2, ag3 = c.gates
+
+    c.connect_out_in(xg, 0, ng1, 0)
+    c.connect_out_in(ng1, 0, ag1, 1)
+    c.connect_out_in(ng1, 0, ag2, 1)
+    c.connect_out_in(ng2, 0, ag3, 0)
+    c.connect_out_in(ag1, 0, og, 0)
+    c.connect_out_in(ag3, 0, og, 1)
+
+    c.connect_in_in(ng2, 0, xg, 0)
+    c.connect_in_in(ag3, 1, xg, 1)
+
+    c.make_chip_from_gates('comparator_cell')
+    return 'comparator_cell'
+
+def build_comparator(c, bits, block=100):
+    """Build a bits-wide magnitude comparator out of comparator_cells.
+
+    Inputs are [lt, eq, a0, b0, a1, b1, ...] and outputs are [lt, eq], with
+    bit 0 the least significant.  Like the cascading inputs of a 7485, lt
+    and eq carry the result of the bits below; set them to 0 and 1 to
+    compare a and b alone.
+    """
+    name = 'comparator_' + str(bits)
+    build_comparator_cell(c)
+    if bits <= block:
+        return build_chain(c, name, 'comparator_cell', bits, 0, 0, 2)
+    assert bits % block == 0, 'Wide comparators must be a multiple of block'
+    unit = build_comparator(c, block, block)
+    return build_chain(c, name, unit, bits // block, 0, 0, 2)
+
+def build_mux(c):
+    """Build mux: inputs [select, a, b], outputs [b if select else a]."""
+    if 'mux' in c.chips:
+        return 'mux'
+    for name in ['not_chip', 'and_chip', 'and_chip', 'or_chip']:
+        c.add_gate(c.chips[name]())
+    ng, ag1, ag2, og = c.gates
+
+    c.connect_out_in(ng, 0, ag1, 0)
+    c.connect_out_in(ag1, 0, og, 0)
+    c.connect_out_in(ag2, 0, og, 1)
+
+    c.connect_in_in(ag2, 0, ng, 0)
+
+    c.make_chip_from_gates('mux')
+    return 'mux'
+
+def build_mux_tree(c, select_bits):
+    """Build a 2**select_bits to 1 multiplexer out of a tree of muxes.
+
+    Inputs are the select bits, most significant first, then the
+    2**select_bits data bits [d0, d1, ...]; the output is the data bit the
+    select bits number.
+    """
+    if select_bits == 1:
+        return build_mux(c)
+    name = 'mux_tree_' + str(select_bits)
+    if name in c.chips:
+        return name
+    unit = build_mux_tree(c, select_bits - 1)
+    build_mux(c)
+    mg, = add_gates(c, 'mux', 1)
+    low, high = add_gates(c, unit, 2)
+
+    c.connect_out_in(low, 0, mg, 1)
+    c.connect_out_in(high, 0, mg, 2)
+    for pin in range(select_bits - 1):
+        c.connect_in_in(high, pin, low, pin)
+
+    c.make_chip_from_gates(name)
+    return name
+
+def build_counter(c, bits):
+    """Build a bits-wide binary counter out of dffs and half_adders.
+
+    The single input enables counting.  Outputs are [overflow, q0, q1, ...],
+    with q0 the least significant bit; the count advances at each clock.
+    """
+    name = 'counter_' + str(bits)
+    if name in c.chips:
+        return name
+    build_half_adder(c)
+    for unit in ['dff', 'half_adder', 'pipe']:
+        for _ in range(bits):
+            c.add_gate(c.chips[unit]())
+    registers, adders, taps = c.gates[:bits], c.gates[bits:2 * bits], \
+        c.gates[2 * bits:]
+    for n in range(bits):
+        c.connect_out_in(registers[n], 0, adders[n], 0)
+        c.connect_out_in(adders[n], 0, registers[n], 0)
+        c.connect_out_in(registers[n], 0, taps[n], 0)
+        if n > 0:
+            c.connect_out_in(adders[n - 1], 1, adders[n], 1)
+    c.make_chip_from_gates(name)
+    return name
@@ -0,0 +1,216 @@
+"""Headless command-line simulator for saved chip libraries.
+
+  python cli.py list LIBRARY
+  python cli.py run LIBRARY CHIP [VECTORS] [-o OUTPUT] [--chunk N]
+                    [--vcd FILE [--nets NAME,...]]
+  python cli.py equiv LIBRARY CHIP_A CHIP_B [--workers N]
+  python cli.py faults LIBRARY CHIP [VECTORS] [--workers N]
+
+run reads one input vector per line from VECTORS, or stdin if it is omitted
+or '-', and writes one line of output bits per vector.  A vector is its
+input bits in pin order, such as '0110' or '0 1 1 0'; blank lines and
+anything after a '#' are skipped.  Vectors are read, evaluated bit-parallel
+and written chunk by chunk, so input of any length runs in constant memory.
+Each line of a chip with storage is one clock cycle instead, starting from
+reset.  --vcd records the named nets, or those listed by --nets, with one
+time step per vector.
+
+faults reads vectors in the same way and reports which stuck-at faults of
+the chip they detect.
+
+Nothing here needs a display: the graphics module is never imported.
+"""
+
+import argparse
+import itertools
+import sys
+
+import chip
+import library
+import netlist
+import stimulus
+
+def parse_vector(text, symbols='01'):
+    """Return the symbols of a vector line as a string.
+
+    symbols are the characters allowed in the vector, '0' and '1' by
+    default or '01XZ' for four-state vectors.  Commas, blanks and anything
+    after a '#' are dropped.
+    """
+    text = text.split('#', 1)[0]
+    bits = ''.join(c for c in text if c not in ' \t\r\n,')
+    if bits.strip(symbols):
+        raise ValueError('Not a vector of {0}: {1}'.format(
+            '/'.join(symbols), text.strip()))
+    return bits
+
+def read_vectors(lines, n):
+    """Yield the non-blank vectors of lines, checking that each has n bits."""
+    for number, line in enumerate(lines, 1):
+        bits = parse_vector(line)
+        if not bits:
+            continue
+        if len(bits) != n:
+            raise ValueError('Line {0}: expected {1} input bits, got {2}'
+                             .format(number, n, len(bits)))
+        yield bits
+
+def run_chunk(compiled, rows, vcd=None):
+    """Return the output bit strings of the input bit strings rows."""
+    width = len(rows)
+    values = [0] * compiled.n_nets
+    outputs = compiled.evaluate_packed(stimulus.pack(rows), width, values)
+    if vcd is not None:
+        vcd.sample_packed(values, width)
+    return [''.join(map(str, row)) for row in netlist.unpack(outputs, width)]
+
+def run_clocked(compiled, vectors, out, vcd=None):
+    """Write the outputs of one clock cycle per vector to out."""
+    import cycle
+    engine = cycle.CycleEngine(compiled, vcd=vcd)
+    for bits in vectors:
+        outputs = engine.step([int(b) for b in bits])
+        out.write(''.join(map(str, outputs)) + '\n')
+
+def run(compiled, lines, out, chunk=4096, vcd=None):
+    """Simulate every vector in lines and write the outputs to out.
+
+    vcd is an optional vcd.VCDWriter that records every vector.
+    """
+    vectors = read_vectors(lines, len(compiled.inputs))
+    if compiled.sequential:
+        run_clocked(compiled, vectors, out, vcd)
+        return
+    while True:
+        rows = list(itertools.islice(vectors, chunk))
+        if not rows:
+            break
+        out.write('\n'.join(run_chunk(compiled, rows, vcd)) + '\n')
+
+def load_chips(file_name, *names):
+    """Load the library file_name and return the Netlists of names."""
+    c = chip.Chip()
+    loaded = library.load_library(c, file_name)
+    for name in names:
+        if name not in loaded:
+            raise ValueError('No chip named {0} in {1}'.format(name,
+                                                               file_name))
+    return [c.chips[name]().netlist for name in names]
+
+def command_list(arguments):
+    c = chip.Chip()
+    for name in library.load_library(c, arguments.library):
+        compiled = c.chips[name]().netlist
+        print('{0}: {1} inputs, {2} outputs, {3} gates{4}'.format(
+            name, len(compiled.inputs), len(compiled.outputs),
+            compiled.n_gates, ', sequential' if compiled.sequential else ''))
+
+def command_run(arguments):
+    compiled, = load_chips(arguments.library, arguments.chip)
+    if arguments.vectors == '-':
+        source = sys.stdin
+    else:
+        source = open(arguments.vectors)
+    if arguments.output == '-':
+        out = sys.stdout
+    else:
+        out = open(arguments.output, 'w', buffering=1 << 16)
+    writer = None
+    try:
+        if arguments.vcd:
+            import vcd
+            nets = arguments.nets.split(',') if arguments.nets else None
+            writer = vcd.VCDWriter(arguments.vcd, compiled, nets,
+                                   arguments.chip)
+        run(compiled, source, out, arguments.chunk, writer)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+        if writer is not None:
+            writer.close()
+
+def command_equiv(arguments):
+    # Imported here since it starts worker processes through
+    # concurrent.futures, which the other commands never need
+    import equivalence
+    a, b = load_chips(arguments.library, arguments.chip_a, arguments.chip_b)
+    found = equivalence.check_equivalence(a, b, workers=arguments.workers)
+    if found is None:
+        print(arguments.chip_a, 'and', arguments.chip_b, 'are equivalent')
+        return 0
+    inputs, outputs_a, outputs_b = found
+    if a.sequential or b.sequential:
+        # One vector per clock cycle from reset
+        inputs = ' '.join(''.join(map(str, vector)) for vector in inputs)
+    else:
+        inputs = ''.join(map(str, inputs))
+    print(arguments.chip_a, 'and', arguments.chip_b, 'differ on',
+          inputs, ':', ''.join(map(str, outputs_a)),
+          '!=', ''.join(map(str, outputs_b)))
+    return 1
+
+def command_faults(arguments):
+    import faults
+    compiled, = load_chips(arguments.library, arguments.chip)
+    if arguments.vectors == '-':
+        source = sys.stdin
+    else:
+        source = open(arguments.vectors)
+    try:
+        vectors = read_vectors(source, len(compiled.inputs))
+        result = faults.simulate_faults(compiled, vectors,
+                                        workers=arguments.workers)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    print(result.report())
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        description='Simulate chips from a saved library without a display')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = commands.add_parser('list', help='list the chips')
+    list_parser.add_argument('library')
+    list_parser.set_defaults(action=command_list)
+
+    run_parser = commands.add_parser('run', help='simulate input vectors')
+    run_parser.add_argument('library')
+    run_parser.add_argument('chip')
+    run_parser.add_argument('vectors', nargs='?', default='-')
+    run_parser.add_argument('--output', '-o', default='-')
+    run_parser.add_argument('--chunk', type=int, default=4096,
+                            help='vectors evaluated together')
+    run_parser.add_argument('--vcd', help='record a waveform to this file')
+    run_parser.add_argument('--nets',
+                            help='comma-separated names of nets to record')
+    run_parser.set_defaults(action=command_run)
+
+    equiv_parser = commands.add_parser('equiv',
+                                       help='check two chips are equivalent')
+    equiv_parser.add_argument('library')
+    equiv_parser.add_argument('chip_a')
+    equiv_parser.add_argument('chip_b')
+    equiv_parser.add_argument('--workers', type=int, default=None)
+    equiv_parser.set_defaults(action=command_equiv)
+
+    faults_parser = commands.add_parser('faults',
+                                        help='grade vectors by fault coverage')
+    faults_parser.add_argument('library')
+    faults_parser.add_argument('chip')
+    faults_parser.add_argument('vectors', nargs='?', default='-')
+    faults_parser.add_argument('--workers', type=int, default=1)
+    faults_parser.set_defaults(action=command_faults)
+    return parser
+
+def main(argv=None):
+    arguments = make_parser().parse_args(argv)
+    try:
+        return arguments.action(arguments) or 0
+    except (OSError, ValueError) as e:
+        sys.exit('cli.py: error: ' + str(e))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""The codegen module compiles chips into straight-line Python functions.
+
+generate_source writes the gates of a Netlist out as Python source: one
+local variable per net and one bitwise expression per gate, in levelized
+order, so evaluating the chip involves no per-gate dispatch at all.  Values
+are packed ints as in Netlist.evaluate_packed, with mask covering the
+vectors in use; mask=1 evaluates a single vector.
+
+compile_netlist compiles that source once per chip structure and caches the
+function, so every chip with the same structure key shares it.
+
+    function = codegen.compile_netlist(compiled)
+    outputs = function(input_words, (1 << width) - 1)
+
+compile_definition instead keeps the hierarchy a chip was made from: every
+distinct sub-chip, by structure key, becomes one function that each of its
+instances calls, and primitive gates are written inline.  The code and the
+time to generate it then grow with the number of distinct chips rather than
+with the number of instances.
+"""
+
+import netlist
+
+from netlist import AND, OR, NOT, PIPE, CONST1, DFF, LATCH, NO_NET
+
+# Functions compiled so far, by Netlist.structure_key
+_functions = {}
+
+# Primitive chips, written inline as expressions, by structure key
+_primitives = dict((netlist.primitive(op).structure_key(), op)
+                   for op in (AND, OR, NOT, PIPE))
+
+# Every sub-chip function compiled by compile_definition, by name; generated
+# code runs with this as its globals so that it can call the others
+_namespace = {}
+
+def generate_source(compiled, name='chip'):
+    """Return the source of a function evaluating compiled.
+
+    The function takes (inputs, mask=1, values=None) and returns the list
+    of output words.  Chips with storage elements read and update them in
+    values, a state vector as for Netlist.evaluate_packed: dff outputs and
+    latch contents are read from it, and latch contents and dff inputs are
+    written back, ready for Netlist.clock.
+    """
+    lines = ['def {0}(inputs, mask=1, values=None):'.format(name)]
+    body = []
+    assigned = set(compiled.inputs)
+    for k, net in enumerate(compiled.inputs):
+        body.append('n{0} = inputs[{1}] & mask'.format(net, k))
+    for op, out in zip(compiled.ops, compiled.outs):
+        if op in (DFF, LATCH):
+            body.append('n{0} = values[{0}]'.format(out))
+            assigned.add(out)
+
+    for op, a, b, out in zip(compiled.ops, compiled.ins_a, compiled.ins_b,
+                             compiled.outs):
+        if op == DFF:
+            continue
+        if op == AND:
+            expression = 'n{0} & n{1}'.format(a, b)
+        elif op == OR:
+            expression = 'n{0} | n{1}'.format(a, b)
+        elif op == NOT:
+            expression = 'n{0} ^ mask'.format(a)
+        elif op == PIPE:
+            expression = 'n{0}'.format(a)
+        elif op == LATCH:
+            expression = 'n{0} & n{1} | n{2} & (n{1} ^ mask)'.format(a, b,
+                                                                     out)
+        else:
+            expression = 'mask' if op == CONST1 else '0'
+        body.append('n{0} = {1}'.format(out, expression))
+        if op == LATCH:
+            body.append('values[{0}] = n{0}'.format(out))
+        assigned.add(out)
+    for d, _ in compiled.registers:
+        body.append('values[{0}] = n{0}'.format(d))
+
+    # Nets read but never driven stay 0, as in Netlist.evaluate
+    read = set(compiled.outputs)
+    for a, b in zip(compiled.ins_a, compiled.ins_b):
+        read.update((a, b))
+    read.discard(NO_NET)
+    undriven = ['n{0} = 0'.format(net) for net in sorted(read - assigned)]
+
+    body = undriven + body
+    body.append('return [{0}]'.format(
+        ', '.join('n{0}'.format(net) for net in compiled.outputs)))
+    lines.extend('    ' + line for line in body)
+    return '\n'.join(lines) + '\n'
+
+def compile_netlist(compiled):
+    """Return the generated function of compiled, compiling it if needed."""
+    key = compiled.structure_key()
+    function = _functions.get(key)
+    if function is None:
+        namespace = {}
+        code = compile(generate_source(compiled),
+                       '<chip {0}>'.format(key[:12]), 'exec')
+        exec(code, namespace)
+        function = _functions[key] = namespace['chip']
+    return function
+
+class Definition(object):
+    """A chip as the instances of other chips it was made from.
+
+    key       -- structure key of the flattened, optimized chip
+    inputs    -- net of each chip input pin, in pin order
+    outputs   -- net of each chip output pin, in pin order
+    instances -- (child, input nets, output nets) of every sub-chip, where
+                 child is the Definition of a chip made of other chips or
+                 the Netlist of a primitive or loaded chip
+    """
+
+    def __init__(self, key, inputs, outputs, instances):
+        self.key = key
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.instances = instances
+
+def instance_order(definition):
+    """Return the instances of definition sorted so that each one only
+    reads nets written by earlier ones.
+
+    Raises ValueError if instances feed back into each other, even if the
+    gates inside them do not form a loop.
+    """
+    drivers = {}
+    for k, (_, _, output_nets) in enumerate(definition.instances):
+        for net in output_nets:
+            drivers[net] = k
+    readers = [[] for _ in definition.instances]
+    waiting = []
+    for k, (_, input_nets, _) in enumerate(definition.instances):
+        sources = set(drivers[net] for net in input_nets if net in drivers)
+        for source in sources:
+            readers[source].append(k)
+        waiting.append(len(sources))
+    ready = [k for k, count in enumerate(waiting) if not count]
+    order = []
+    while ready:
+        k = ready.pop()
+        order.append(k)
+        for reader in readers[k]:
+            waiting[reader] -= 1
+            if not waiting[reader]:
+                ready.append(reader)
+    if len(order) != len(definition.instances):
+        raise ValueError('Sub-chips of a definition feed back into each other')
+    return order
+
+def define(child):
+    """Compile child into _namespace if needed; return its function name.
+
+    A Definition becomes chip_<key>(mask, *input words), returning a tuple
+    of output words; a Netlist becomes flat_<key> as in generate_source.
+    Raises ValueError for a sequential Netlist, whose storage needs the
+    values a chip_<key> function does not keep.
+    """
+    if isinstance(child, Definition):
+        name = 'chip_' + child.key
+    elif child.sequential:
+        raise ValueError('Shared code needs combinational sub-chips')
+    else:
+        name = 'flat_' + child.structure_key()
+    if name not in _namespace:
+        if isinstance(child, Definition):
+            source = generate_definition_source(child, name)
+        else:
+            source = generate_source(child, name)
+        exec(compile(source, '<{0}>'.format(name[:17]), 'exec'), _namespace)
+    return name
+
+def generate_definition_source(definition, name):
+    """Return the source of a function evaluating definition.
+
+    The function takes (mask, *input words) and calls the function of each
+    sub-chip, compiling them first with define.
+    """
+    arguments = ''.join(', n{0}'.format(net) for net in definition.inputs)
+    lines = ['def {0}(mask{1}):'.format(name, arguments)]
+    body = []
+    assigned = set(definition.inputs)
+    read = set(definition.outputs)
+    for k in instance_order(definition):
+        child, input_nets, output_nets = definition.instances[k]
+        read.update(input_nets)
+        assigned.update(output_nets)
+        ins = ['n{0}'.format(net) for net in input_nets]
+        outs = ['n{0}'.format(net) for net in output_nets]
+        op = None
+        if not isinstance(child, Definition):
+            op = _primitives.get(child.structure_key())
+        if op == AND:
+            body.append('{0} = {1} & {2}'.format(outs[0], *ins))
+        elif op == OR:
+            body.append('{0} = {1} | {2}'.format(outs[0], *ins))
+        elif op == NOT:
+            body.append('{0} = {1} ^ mask'.format(outs[0], ins[0]))
+        elif op == PIPE:
+            body.append('{0} = {1}'.format(outs[0], ins[0]))
+        else:
+            function = define(child)
+            if isinstance(child, Definition):
+                call = '{0}(mask{1})'.format(
+                    function, ''.join(', ' + word for word in ins))
+            else:
+                call = '{0}(({1}), mask)'.format(
+                    function, ''.join(word + ', ' for word in ins))
+            if outs:
+                call = ', '.join(outs) + ', = ' + call
+            body.append(call)
+
+    # Nets read but never driven stay 0, as in Netlist.evaluate
+    undriven = ['n{0} = 0'.format(net) for net in sorted(read - assigned)]
+    body = undriven + body
+    outs = ['n{0}'.format(net) for net in definition.outputs]
+    if len(outs) == 1:
+        body.append('return {0},'.format(outs[0]))
+    else:
+        body.append('return ({0})'.format(', '.join(outs)))
+    lines.extend('    ' + line for line in body)
+    return '\n'.join(lines) + '\n'
+
+def compile_definition(definition):
+    """Return a function evaluating definition, like compile_netlist's.
+
+    Every sub-chip is compiled once per structure and shared by all its
+    instances and by every chip that uses it.
+    """
+    key = ('definition', definition.key)
+    function = _functions.get(key)
+    if function is None:
+        chip_function = _namespace[define(definition)]
+        def function(inputs, mask=1, values=None):
+            return list(chip_function(mask, *[word & mask
+                                              for word in inputs]))
+        _functions[key] = function
+    return function
@@ -0,0 +1,96 @@
+"""The equivalence module checks whether two chips compute the same function.
+
+Pins are matched by position.  Small chips are compared on every input
+vector at once, bit-parallel.  Wide chips are first run on random vectors,
+which finds most differences almost at once, and then compared on every
+vector, sharded across processes by the parallel module.  Either way the
+search stops at the first difference.
+
+Chips with storage are compared cycle by cycle from reset, on random input
+sequences of a bounded number of clock cycles, so for them None only means
+that no such sequence told the chips apart.
+"""
+
+import random
+
+import cycle
+import parallel
+
+def check_equivalence(a, b, random_rounds=16, width=4096,
+                      exhaustive_limit=32, workers=None, seed=0, cycles=64):
+    """Return a counterexample where Netlists a and b differ, or None.
+
+    Chips with up to 20 inputs are compared exhaustively in this process.
+    Wider chips are first tried on random_rounds rounds of width random
+    vectors and then, if they have at most exhaustive_limit inputs, compared
+    exhaustively across workers processes.  Above exhaustive_limit, None
+    only means that no random vector told the chips apart.
+
+    A counterexample is a tuple (inputs, outputs of a, outputs of b).
+
+    If either chip has storage, both are instead run for cycles clock
+    cycles from reset on random_rounds rounds of width random input
+    sequences.  A counterexample then has the input vectors of every cycle
+    up to the first one where the outputs differ, and the outputs of that
+    cycle.
+    """
+    if len(a.inputs) != len(b.inputs) or len(a.outputs) != len(b.outputs):
+        raise ValueError('Chips have different numbers of pins!')
+    if a.sequential or b.sequential:
+        return sequential_search(a, b, random_rounds, width, cycles, seed)
+    n = len(a.inputs)
+    if n <= 20:
+        workers = 1
+    else:
+        found = random_search(a, b, random_rounds, width, seed)
+        if found is not None or n > exhaustive_limit:
+            return found
+    found = parallel.find_counterexample(a, parallel.Matches(b), workers)
+    if found is not None:
+        return counterexample(a, b, found[0])
+    return None
+
+def random_search(a, b, rounds, width, seed):
+    """Return a counterexample among rounds * width random vectors, or None."""
+    rng = random.Random(seed)
+    differ = parallel.Matches(b)
+    for _ in range(rounds):
+        words = [rng.getrandbits(width) for _ in a.inputs]
+        failures = differ(words, a.evaluate_packed(words, width),
+                          (1 << width) - 1)
+        if failures:
+            bit = (failures & -failures).bit_length() - 1
+            return counterexample(a, b, [word >> bit & 1 for word in words])
+    return None
+
+def sequential_search(a, b, rounds, width, cycles, seed):
+    """Return a counterexample among rounds * width random input sequences
+    of cycles cycles each, or None."""
+    rng = random.Random(seed)
+    for _ in range(rounds):
+        engine_a = cycle.CycleEngine(a, width)
+        engine_b = cycle.CycleEngine(b, width)
+        history = []
+        for _ in range(cycles):
+            words = [rng.getrandbits(width) for _ in a.inputs]
+            history.append(words)
+            outputs_a = engine_a.step(words)
+            outputs_b = engine_b.step(words)
+            failures = 0
+            for word_a, word_b in zip(outputs_a, outputs_b):
+                failures |= word_a ^ word_b
+            if failures:
+                bit = (failures & -failures).bit_length() - 1
+                return ([[word >> bit & 1 for word in words]
+                         for words in history],
+                        [word >> bit & 1 for word in outputs_a],
+                        [word >> bit & 1 for word in outputs_b])
+    return None
+
+def counterexample(a, b, inputs):
+    return inputs, a.evaluate(inputs), b.evaluate(inputs)
+
+def check_chips(c, name_a, name_b, **options):
+    """Compare two entries of c.chips; see check_equivalence."""
+    return check_equivalence(c.chips[name_a]().netlist,
+                             c.chips[name_b]().netlist, **options)
@@ -0,0 +1,216 @@
+"""The faults module grades test vectors by their stuck-at fault coverage.
+
+A stuck-at fault holds one net of a chip at 0, or at 1, whatever drives it.
+A vector detects the fault if some output of the faulty chip differs from
+the good chip.  Vectors are packed width to a word, as for
+Netlist.evaluate_packed, and each fault is simulated as events from the
+good chip's values: only the nets whose values differ from the good chip
+are kept, only the gates that read one of them are evaluated, and the
+fault stops as soon as no difference is left to propagate.  Faults are
+dropped as soon as a vector detects them, so later vectors only simulate
+the faults still undetected.  With several workers the faults are split across
+processes, each of which receives the netlist and the vectors once.
+
+    result = faults.simulate_faults(c.chips['adder_8']().netlist, vectors)
+    print(result.report())
+"""
+
+import heapq
+import itertools
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import stimulus
+
+from netlist import AND, OR, NOT, PIPE, NO_NET
+
+# The Netlist and packed vectors of the current worker process
+_worker_netlist = None
+_worker_batches = None
+
+def _init_worker(compiled, batches):
+    global _worker_netlist, _worker_batches
+    _worker_netlist, _worker_batches = compiled, batches
+
+def _grade_shard(faults):
+    return grade(_worker_netlist, faults, _worker_batches)
+
+def fault_list(compiled):
+    """Return every stuck-at fault of compiled as (net, stuck value) pairs.
+
+    There are two faults on each input pin and on the output of each gate.
+    """
+    nets = sorted(set(compiled.inputs).union(compiled.outs))
+    return [(net, value) for net in nets for value in (0, 1)]
+
+def pack_vectors(vectors, width):
+    """Yield (input words, count) for every width vectors of vectors.
+
+    A vector is a sequence of bits in pin order, as ints or '0' and '1'.
+    """
+    vectors = iter(vectors)
+    while True:
+        rows = list(itertools.islice(vectors, width))
+        if not rows:
+            return
+        yield stimulus.pack(rows), len(rows)
+
+def fanout_readers(compiled):
+    """Return, for every net of compiled, the indices of the gates it feeds.
+
+    The lists are built for each grading run rather than kept on the
+    Netlist, so fault simulation leaves nothing behind on a shared chip.
+    """
+    readers = [[] for _ in range(compiled.n_nets)]
+    for g, (a, b) in enumerate(zip(compiled.ins_a, compiled.ins_b)):
+        for source in {a, b} - {NO_NET}:
+            readers[source].append(g)
+    return readers
+
+def detect(compiled, faults, words, width, readers=None):
+    """Return {fault: first detecting vector} for width packed vectors.
+
+    Faults that none of the vectors detect are left out.  readers is
+    fanout_readers(compiled), computed here if not given.
+    """
+    if readers is None:
+        readers = fanout_readers(compiled)
+    mask = (1 << width) - 1
+    good = [0] * compiled.n_nets
+    compiled.evaluate_packed(words, width, good)
+    ops, ins_a, ins_b, outs = (compiled.ops, compiled.ins_a, compiled.ins_b,
+                               compiled.outs)
+    outputs = compiled.outputs
+    detected = {}
+    for fault in faults:
+        net, value = fault
+        stuck = mask if value else 0
+        if good[net] == stuck:
+            # No vector sets the net to the other value
+            continue
+        # The faulty value of every net that differs from the good chip;
+        # gates are taken in gate order, so each sees its inputs settled
+        # and is evaluated at most once
+        faulty = {net: stuck}
+        pending = list(readers[net])
+        heapq.heapify(pending)
+        queued = set(pending)
+        while pending:
+            g = heapq.heappop(pending)
+            op, a, out = ops[g], ins_a[g], outs[g]
+            x = faulty.get(a, good[a])
+            if op == AND:
+                b = ins_b[g]
+                x &= faulty.get(b, good[b])
+            elif op == OR:
+                b = ins_b[g]
+                x |= faulty.get(b, good[b])
+            elif op == NOT:
+                x ^= mask
+            elif op != PIPE:
+                # Constants read nothing and combinational chips have no
+                # storage elements
+                continue
+            if x == good[out]:
+                # Masked here
+                continue
+            faulty[out] = x
+            for reader in readers[out]:
+                if reader not in queued:
+                    queued.add(reader)
+                    heapq.heappush(pending, reader)
+        differ = 0
+        for out in outputs:
+            if out in faulty:
+                differ |= faulty[out] ^ good[out]
+        if differ:
+            detected[fault] = (differ & -differ).bit_length() - 1
+    return detected
+
+def grade(compiled, faults, batches):
+    """Return {fault: first detecting vector} over batches of pack_vectors.
+
+    Each fault is simulated until the first batch that detects it.
+    """
+    readers = fanout_readers(compiled)
+    detected = {}
+    remaining = list(faults)
+    offset = 0
+    for words, width in batches:
+        if not remaining:
+            break
+        found = detect(compiled, remaining, words, width, readers)
+        for fault, v in found.items():
+            detected[fault] = offset + v
+        remaining = [fault for fault in remaining if fault not in found]
+        offset += width
+    return detected
+
+def simulate_faults(compiled, vectors, faults=None, width=256, workers=1):
+    """Return the FaultCoverage of vectors on a combinational Netlist.
+
+    faults defaults to fault_list(compiled).  vectors is any iterable of
+    vectors, as for pack_vectors; it is read once, width vectors at a time.
+    workers is the number of processes to split the faults across, or None
+    for one per CPU.
+    """
+    if compiled.sequential:
+        raise ValueError('Fault simulation needs a combinational chip')
+    if faults is None:
+        faults = fault_list(compiled)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    batches = pack_vectors(vectors, width)
+    workers = min(workers, len(faults))
+    if workers <= 1:
+        detected = grade(compiled, faults, batches)
+    else:
+        batches = list(batches)
+        # Neighbouring faults lie in the same part of the chip, so deal
+        # them out in turn to balance the work between processes
+        shards = [faults[k::workers] for k in range(workers)]
+        detected = {}
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(compiled, batches)) as pool:
+            for found in pool.map(_grade_shard, shards):
+                detected.update(found)
+    return FaultCoverage(compiled, faults, detected)
+
+class FaultCoverage(object):
+    """The faults a set of test vectors detects.
+
+    faults     -- every fault simulated, as (net, stuck value) pairs
+    detected   -- dict from each detected fault to the index of the first
+                  vector that detects it
+    undetected -- the faults no vector detects, in the order of faults
+    """
+
+    def __init__(self, compiled, faults, detected):
+        self.names = compiled.names
+        self.faults = list(faults)
+        self.detected = detected
+        self.undetected = [fault for fault in self.faults
+                           if fault not in detected]
+
+    @property
+    def coverage(self):
+        """The fraction of the faults that are detected."""
+        if not self.faults:
+            return 1.0
+        return len(self.detected) / len(self.faults)
+
+    def fault_name(self, fault):
+        net, value = fault
+        return '{0} stuck-at-{1}'.format(self.names.get(net, 'net' + str(net)),
+                                         value)
+
+    def report(self):
+        """Return the coverage and the undetected faults as text."""
+        lines = ['{0} of {1} faults detected, {2:.1%} coverage'.format(
+            len(self.detected), len(self.faults), self.coverage)]
+        if self.undetected:
+            lines.append('Undetected faults:')
+            lines.extend('  ' + self.fault_name(fault)
+                         for fault in self.undetected)
+        return '\n'.join(lines)
@@ -0,0 +1,133 @@
+"""The fourstate module simulates chips with the values 0, 1, X and Z.
+
+X is an unknown value, such as the contents of a storage element that has
+never been loaded, and Z is a floating net that nothing drives, such as an
+input pin left unset.  Gates read Z as X.  Where the known inputs of a gate
+decide its output it is known: an and gate with a 0 input gives 0 and a
+latch that holds the value at its input keeps it whatever its enable.
+
+Every value is two packed bit-planes, high where it can be 1 and low where
+it can be 0, so width vectors are evaluated in one pass over the gates as
+in Netlist.evaluate_packed:
+
+    high  low
+      0    1    0
+      1    0    1
+      1    1    X
+      0    0    Z
+
+Each gate then costs about two word operations: an and gate can be 1 where
+both inputs can be 1 and can be 0 where either input can.  Inside the chip
+a floating net is held as X, with its floating bits kept aside, and only
+reads as Z at the pins.
+
+    state = fourstate.new_state(compiled, 1)
+    fourstate.evaluate(compiled, [1, X, Z], state)
+"""
+
+from netlist import AND, OR, NOT, PIPE, CONST1, DFF, LATCH
+
+X = 'X'
+Z = 'Z'
+
+# The (high, low) bits of each symbol
+ENCODING = {0: (0, 1), 1: (1, 0), X: (1, 1), Z: (0, 0)}
+SYMBOLS = dict((bits, symbol) for symbol, bits in ENCODING.items())
+
+def encode(vectors):
+    """Return (high words, low words) of vectors of 0, 1, X and Z."""
+    high_words = []
+    low_words = []
+    for pins in zip(*vectors):
+        high = low = 0
+        for v, symbol in enumerate(pins):
+            bits = ENCODING[symbol]
+            high |= bits[0] << v
+            low |= bits[1] << v
+        high_words.append(high)
+        low_words.append(low)
+    return high_words, low_words
+
+def decode(high_words, low_words, width):
+    """Return the width vectors of symbols packed in the two planes."""
+    return [[SYMBOLS[high >> v & 1, low >> v & 1]
+             for high, low in zip(high_words, low_words)]
+            for v in range(width)]
+
+def new_state(compiled, width):
+    """Return the state of compiled before any evaluation.
+
+    The state is (highs, lows, floating): highs and lows hold the planes of
+    every net, which start at X, and floating maps the nets that nothing
+    drives, the input pins and any undriven nets, to the bits where they
+    float.
+    """
+    mask = (1 << width) - 1
+    highs = [mask] * compiled.n_nets
+    lows = [mask] * compiled.n_nets
+    undriven = set(range(compiled.n_nets)) - set(compiled.outs) - \
+        set(compiled.inputs)
+    floating = dict((net, mask) for net in undriven)
+    return highs, lows, floating
+
+def evaluate_packed(compiled, high_words, low_words, width, state=None):
+    """Return the output planes for width vectors packed into two planes.
+
+    state is a state of new_state, which receives the planes of every net
+    and holds storage elements between calls.
+    """
+    assert len(high_words) == len(low_words) == len(compiled.inputs), \
+        'Expected {0} inputs, got {1}'.format(len(compiled.inputs),
+                                              len(high_words))
+    mask = (1 << width) - 1
+    if state is None:
+        state = new_state(compiled, width)
+    highs, lows, floating = state
+    for net, high, low in zip(compiled.inputs, high_words, low_words):
+        float_bits = (high | low) & mask ^ mask
+        floating[net] = float_bits
+        highs[net] = high & mask | float_bits
+        lows[net] = low & mask | float_bits
+    for op, a, b, out in zip(compiled.ops, compiled.ins_a, compiled.ins_b,
+                             compiled.outs):
+        if op == AND:
+            highs[out] = highs[a] & highs[b]
+            lows[out] = lows[a] | lows[b]
+        elif op == OR:
+            highs[out] = highs[a] | highs[b]
+            lows[out] = lows[a] & lows[b]
+        elif op == NOT:
+            highs[out], lows[out] = lows[a], highs[a]
+        elif op == PIPE:
+            highs[out], lows[out] = highs[a], lows[a]
+        elif op == LATCH:
+            # Open where the enable can be 1, holding where it can be 0
+            enable_high, enable_low = highs[b], lows[b]
+            highs[out] = enable_high & highs[a] | enable_low & highs[out]
+            lows[out] = enable_high & lows[a] | enable_low & lows[out]
+        elif op != DFF:
+            highs[out] = mask if op == CONST1 else 0
+            lows[out] = 0 if op == CONST1 else mask
+    output_highs = []
+    output_lows = []
+    for net in compiled.outputs:
+        float_bits = floating.get(net, 0)
+        output_highs.append(highs[net] & ~float_bits)
+        output_lows.append(lows[net] & ~float_bits)
+    return output_highs, output_lows
+
+def evaluate(compiled, inputs, state=None):
+    """Return the outputs of one vector of 0, 1, X and Z as symbols.
+
+    state is as for evaluate_packed, with width 1.
+    """
+    high_words, low_words = encode([inputs])
+    outputs = evaluate_packed(compiled, high_words, low_words, 1, state)
+    return decode(outputs[0], outputs[1], 1)[0]
+
+def clock(compiled, state):
+    """Copy the input planes of every dff into its output, all at once."""
+    highs, lows, _ = state
+    updates = [(highs[d], lows[d]) for d, _ in compiled.registers]
+    for (_, q), (high, low) in zip(compiled.registers, updates):
+        highs[q], lows[q] = high, low
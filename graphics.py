@@ -54,6 +54,10 @@ class Canvas(object):
             self._draw_background()
         self._canvas.update()
 
+    def delete(self, id):
+        """Delete one shape, text, or image without redrawing the canvas."""
+        self._canvas.delete(id)
+
     def draw_polygon(self, points, color='Black', fill_color=None, filled=1, smooth=0, width=1):
         """Draw a polygon and return its tkinter id.
 
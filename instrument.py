@@ -0,0 +1,183 @@
+"""The instrument module counts and traces what the simulators do.
+
+Instrumentation costs nothing while it is off: no simulation path checks
+whether it is on.  Enabling a Probe swaps instrumented versions of
+Connector.set_value, Gate.new_val and Netlist.evaluate into their classes,
+and disabling it puts the plain ones back.  At most one Probe is enabled at
+a time.
+
+    probe = instrument.Probe()
+    with probe:
+        c.simulate_chip(c.chips['adder_8'], inputs)
+    print(probe.report())
+    probe.dump()
+
+Levelized evaluation fires every gate exactly once per vector, so its gate
+counts follow from the number of vectors; connector propagation is counted
+gate by gate.  Bit-parallel evaluation (Netlist.evaluate_packed), and with
+it truth tables, and generated code are not instrumented: to see every
+vector, build the Chip with table_max_inputs = 0 and levelized or connector
+propagation, as main.py --verbose does.
+"""
+
+import sys
+
+from collections import Counter, deque
+
+import chip
+import netlist
+
+_active = None
+_plain = {}
+
+class Probe(object):
+    """Evaluation counts, propagation depth and a trace of net changes.
+
+    trace_size -- number of recent net changes kept for dump
+    echo       -- also print every change of a named net as it happens
+    """
+
+    def __init__(self, trace_size=1024, echo=False):
+        self.trace = deque(maxlen=trace_size)
+        self.echo = echo
+        self.reset()
+
+    def reset(self):
+        """Clear every count and the trace."""
+        self.vectors = 0
+        self.redundant = 0
+        self.max_depth = 0
+        self.trace.clear()
+        # Connector propagation: evaluations of every Gate and the depth of
+        # every Connector and Gate in the current vector
+        self.gate_evaluations = Counter()
+        self.depths = {}
+        self.vector_gates = set()
+        self.vector_inputs = set()
+        # Levelized evaluation: vectors per Netlist and its last net values
+        self.netlist_vectors = Counter()
+        self.previous = {}
+
+    def enable(self):
+        global _active
+        assert _active is None, 'Another Probe is already enabled'
+        _active = self
+        _plain['set_value'] = chip.Connector.set_value
+        _plain['new_val'] = chip.Gate.new_val
+        _plain['evaluate'] = netlist.Netlist.evaluate
+        chip.Connector.set_value = _set_value
+        chip.Gate.new_val = _new_val
+        netlist.Netlist.evaluate = _evaluate
+
+    def disable(self):
+        global _active
+        if _active is not self:
+            return
+        chip.Connector.set_value = _plain['set_value']
+        chip.Gate.new_val = _plain['new_val']
+        netlist.Netlist.evaluate = _plain['evaluate']
+        _active = None
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def begin_vector(self):
+        self.vectors += 1
+        self.vector_gates.clear()
+        self.vector_inputs.clear()
+
+    def record(self, name, value):
+        self.trace.append((self.vectors, name, value))
+        if self.echo and name is not None:
+            print(name, '=', value)
+
+    def gate_counts(self):
+        """Return a Counter of evaluations per gate.
+
+        Gates are Gate objects for connector propagation and (Netlist, gate
+        index) pairs for levelized evaluation.
+        """
+        counts = Counter(self.gate_evaluations)
+        for compiled, vectors in self.netlist_vectors.items():
+            for index in range(compiled.n_gates):
+                counts[compiled, index] += vectors
+        return counts
+
+    def type_counts(self):
+        """Return a Counter of evaluations per primitive chip name."""
+        names = dict((id(operation), netlist.OPCODE_NAMES[op])
+                     for op, operation in chip.primitive_operations.items())
+        counts = Counter()
+        for gate, evaluations in self.gate_evaluations.items():
+            counts[names.get(id(gate.operation), 'other')] += evaluations
+        for compiled, vectors in self.netlist_vectors.items():
+            for op, gates in Counter(compiled.ops).items():
+                counts[netlist.OPCODE_NAMES[op]] += gates * vectors
+        return counts
+
+    def report(self):
+        """Return the counts as a dict of plain values."""
+        by_type = self.type_counts()
+        return {'vectors': self.vectors,
+                'evaluations': sum(by_type.values()),
+                'redundant': self.redundant,
+                'redundant_per_vector': self.redundant / self.vectors
+                if self.vectors else 0.0,
+                'max_depth': self.max_depth,
+                'by_type': dict(by_type)}
+
+    def dump(self, file=None):
+        """Print the traced net changes, oldest first."""
+        file = file if file is not None else sys.stdout
+        for vector, name, value in self.trace:
+            print('{0:>8} {1} = {2}'.format(
+                vector, name if name is not None else '<unnamed>', value),
+                file=file)
+
+def _set_value(connector, source, value):
+    probe = _active
+    if source == 'chip':
+        # Chips set every input pin in turn; a vector starts at the first
+        # pin and ends when one is set again or another vector starts
+        if connector in probe.vector_inputs or not probe.vector_inputs:
+            probe.begin_vector()
+        probe.vector_inputs.add(connector)
+        probe.depths[connector] = 0
+    elif isinstance(source, chip.Gate):
+        probe.depths[connector] = probe.depths.get(source, 0)
+    if value != connector.value:
+        probe.record(connector.name, value)
+    _plain['set_value'](connector, source, value)
+
+def _new_val(gate):
+    probe = _active
+    if gate.inputs and all(c.value is not None for c in gate.inputs):
+        probe.gate_evaluations[gate] += 1
+        if gate in probe.vector_gates:
+            probe.redundant += 1
+        probe.vector_gates.add(gate)
+        depth = 1 + max(probe.depths.get(c, 0) for c in gate.inputs)
+        probe.depths[gate] = depth
+        probe.max_depth = max(probe.max_depth, depth)
+    _plain['new_val'](gate)
+
+def _evaluate(compiled, input_values, values=None):
+    probe = _active
+    probe.begin_vector()
+    if values is None:
+        values = [0] * compiled.n_nets
+        before = probe.previous.get(compiled) or [0] * compiled.n_nets
+        probe.previous[compiled] = values
+    else:
+        before = list(values)
+    outputs = _plain['evaluate'](compiled, input_values, values)
+    probe.netlist_vectors[compiled] += 1
+    probe.max_depth = max(probe.max_depth, compiled.depth)
+    for net in range(compiled.n_nets):
+        if values[net] != before[net]:
+            probe.record(compiled.names.get(net), values[net])
+    return outputs
@@ -0,0 +1,187 @@
+"""The library module saves and loads chip libraries in a binary format.
+
+A library file holds the compiled netlist of every chip made with
+make_chip_from_gates.  All fields are little-endian 32-bit words, so on
+little-endian machines a loaded netlist's gate columns are memoryviews
+straight into the memory-mapped file and opening a library only reads its
+directory and pin names.
+
+Layout (offsets in bytes from the start of the file):
+
+  header     magic b'LSIM', version, chip count
+  directory  per chip: name offset, name length, body offset
+  body       n_nets, n_inputs, n_outputs, n_gates, n_names, depth,
+             inputs, outputs, ins_a, ins_b, outs, name nets,
+             name offsets, name lengths (n_* words each),
+             then the n_gates opcode bytes padded to a word
+  strings    UTF-8 chip and net names, each padded to a word
+"""
+
+import mmap
+import os
+import struct
+import sys
+
+from array import array
+
+import netlist
+
+MAGIC = b'LSIM'
+VERSION = 1
+
+HEADER = struct.Struct('<4sII')
+ENTRY = struct.Struct('<III')
+COUNTS = struct.Struct('<6I')
+
+def padded(data):
+    """Return data padded with zero bytes to a multiple of four."""
+    return data + b'\0' * (-len(data) % 4)
+
+def words(values):
+    """Return the little-endian bytes of a sequence of 32-bit ints."""
+    column = array('i', values)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column.tobytes()
+
+def body_size(chip_netlist):
+    """Return the bytes taken by the body of chip_netlist."""
+    n_words = len(chip_netlist.inputs) + len(chip_netlist.outputs) + \
+        3 * chip_netlist.n_gates + 3 * len(chip_netlist.names)
+    return COUNTS.size + 4 * n_words + (chip_netlist.n_gates + 3) // 4 * 4
+
+def save_library(c, file_name, names=None):
+    """Save chips of Chip c; names defaults to every non-primitive chip."""
+    if names is None:
+        names = [name for name in c.chips
+                 if name not in netlist.OPCODE_NAMES]
+    compiled = [c.chips[name]().netlist for name in names]
+
+    body_offsets = [HEADER.size + ENTRY.size * len(names)]
+    for chip_netlist in compiled:
+        body_offsets.append(body_offsets[-1] + body_size(chip_netlist))
+    strings = bytearray()
+    def add_string(text):
+        data = text.encode('utf-8')
+        offset = body_offsets[-1] + len(strings)
+        strings.extend(padded(data))
+        return offset, len(data)
+
+    # Chips loaded from file_name still read their columns from its mapping,
+    # so write a new file beside it and only then replace it
+    temp_name = file_name + '.tmp'
+    try:
+        with open(temp_name, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(names)))
+            for name, offset in zip(names, body_offsets):
+                f.write(ENTRY.pack(*add_string(name) + (offset,)))
+            for chip_netlist in compiled:
+                named = sorted(chip_netlist.names.items())
+                refs = [add_string(name) for _, name in named]
+                f.write(COUNTS.pack(chip_netlist.n_nets,
+                                    len(chip_netlist.inputs),
+                                    len(chip_netlist.outputs),
+                                    chip_netlist.n_gates, len(named),
+                                    chip_netlist.depth))
+                for column in [chip_netlist.inputs, chip_netlist.outputs,
+                               chip_netlist.ins_a, chip_netlist.ins_b,
+                               chip_netlist.outs, [net for net, _ in named],
+                               [offset for offset, _ in refs],
+                               [length for _, length in refs]]:
+                    f.write(words(column))
+                f.write(padded(bytes(chip_netlist.ops)))
+            f.write(strings)
+        os.replace(temp_name, file_name)
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+        raise
+
+def check_range(data, offset, size, what):
+    """Raise ValueError unless data holds size bytes at offset."""
+    if offset < 0 or size < 0 or offset + size > len(data):
+        raise ValueError('Chip library is truncated or corrupt: ' + what +
+                         ' runs past the end of the file')
+
+def check_nets(column, low, n_nets, what):
+    """Raise ValueError if a net of column is outside low .. n_nets - 1."""
+    if len(column) and (min(column) < low or max(column) >= n_nets):
+        raise ValueError('Chip library is corrupt: ' + what +
+                         ' refer to missing nets')
+
+def read_string(data, offset, length, what):
+    check_range(data, offset, length, what)
+    try:
+        return bytes(data[offset:offset + length]).decode()
+    except UnicodeDecodeError:
+        raise ValueError('Chip library is corrupt: ' + what +
+                         ' is not UTF-8')
+
+def load_library(c, file_name):
+    """Add every chip in the library file to Chip c and return their names.
+
+    Chips already in c with the same names are replaced.  Raises ValueError
+    if the file is not a well-formed chip library.
+    """
+    with open(file_name, 'rb') as f:
+        data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    check_range(data, 0, HEADER.size, 'the header')
+    magic, version, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(file_name + ' is not a chip library')
+    if version != VERSION:
+        raise ValueError('Unsupported chip library version: ' + str(version))
+    check_range(data, HEADER.size, ENTRY.size * count, 'the directory')
+
+    names = []
+    for k in range(count):
+        name_offset, name_length, body_offset = ENTRY.unpack_from(
+            data, HEADER.size + ENTRY.size * k)
+        name = read_string(data, name_offset, name_length, 'a chip name')
+        c.add_compiled_chip(name, read_netlist(data, body_offset))
+        names.append(name)
+    return names
+
+def read_netlist(data, offset):
+    """Return the Netlist whose body starts at offset in data.
+
+    Raises ValueError if the body does not fit in data or refers to nets or
+    opcodes that do not exist.
+    """
+    check_range(data, offset, COUNTS.size, 'a chip body')
+    n_nets, n_inputs, n_outputs, n_gates, n_names, depth = \
+        COUNTS.unpack_from(data, offset)
+    offset += COUNTS.size
+    if n_nets >= 1 << 31:
+        raise ValueError('Chip library is corrupt: too many nets')
+    n_words = n_inputs + n_outputs + 3 * n_gates + 3 * n_names
+    check_range(data, offset, 4 * n_words + n_gates, 'a chip body')
+
+    def take(count):
+        nonlocal offset
+        view = data[offset:offset + 4 * count]
+        offset += 4 * count
+        if sys.byteorder == 'big':
+            column = array('i')
+            column.frombytes(view)
+            column.byteswap()
+            return column
+        return view.cast('i')
+
+    inputs, outputs = take(n_inputs), take(n_outputs)
+    ins_a, ins_b, outs = take(n_gates), take(n_gates), take(n_gates)
+    name_nets, name_offsets, name_lengths = [take(n_names) for _ in range(3)]
+    ops = data[offset:offset + n_gates]
+    for column, low, what in [(inputs, 0, 'inputs'), (outputs, 0, 'outputs'),
+                              (ins_a, netlist.NO_NET, 'gate inputs'),
+                              (ins_b, netlist.NO_NET, 'gate inputs'),
+                              (outs, 0, 'gate outputs'),
+                              (name_nets, 0, 'net names')]:
+        check_nets(column, low, n_nets, what)
+    if n_gates and max(ops) >= len(netlist.OPCODE_NAMES):
+        raise ValueError('Chip library is corrupt: unknown gate opcode')
+    names = {}
+    for net, start, length in zip(name_nets, name_offsets, name_lengths):
+        names[net] = read_string(data, start, length, 'a net name')
+    return netlist.Netlist(n_nets, inputs, outputs, ops, ins_a, ins_b, outs,
+                           names, depth)
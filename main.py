@@ -1,10 +1,15 @@
+import argparse
 import graphics
 import chip
+import cli
+import equivalence
+import fourstate
+import instrument
+import library
 import os
+import stimulus
 import sys
-import pickle
-
-from itertools import product
+import view
 
 class Button(object):
     def __init__(self, name, pos, width, height, action):
@@ -60,33 +65,93 @@ def clear(parameters):
     parameters.reset()
     parameters.chip.reset()
 
+def stimulus_source(text, n):
+    # Returns the stimulus source named by text, or None for a single vector:
+    # 'all [START]', 'gray [START]' or 'random COUNT [SEED [START]]'
+    words = text.split()
+    if not words or words[0] not in ('all', 'gray', 'random'):
+        return None
+    numbers = [int(word) for word in words[1:]]
+    if words[0] == 'random':
+        if not 1 <= len(numbers) <= 3:
+            raise ValueError('Expected random COUNT [SEED [START]]')
+        return stimulus.Random(n, *numbers)
+    if len(numbers) > 1:
+        raise ValueError('Expected ' + words[0] + ' [START]')
+    if words[0] == 'all':
+        return stimulus.Exhaustive(n, *numbers)
+    return stimulus.GrayCode(n, *numbers)
+
 def simulate(parameters):
     if parameters.selected_chip:
-        run_chip = lambda inputs: parameters.chip.simulate_chip(
-                parameters.chip.chips[parameters.selected_chip], inputs)
-        inputs = input("Please specify the input pins: ")
-        if inputs != 'all':
-            inputs = list(eval(inputs))
-            combinations = [inputs]
-        else:
-            num_inputs = parameters.chip.chips[parameters.selected_chip
-                                               ]().len_inputs
-            if num_inputs > 5:
-                return 'Too many inputs to simulate simultaneously'
-            args = [[1, 0] for _ in range(num_inputs)]
-            combinations = list(product(*args))
+        selected = parameters.chip.chips[parameters.selected_chip]
+        inputs = input("Please specify the input pins (0, 1, X or Z), or "
+                       "all, gray or random COUNT: ")
         print(inputs, parameters.selected_chip)
-        for comb in combinations:
-            run_chip(comb)
+        try:
+            source = stimulus_source(inputs, selected().len_inputs)
+            if source is None:
+                bits = cli.parse_vector(inputs.upper(), '01XZ')
+                if len(bits) != selected().len_inputs:
+                    raise ValueError('Expected {0} input pins'.format(
+                        selected().len_inputs))
+                if bits.strip('01'):
+                    vector = [int(bit) if bit in '01' else bit
+                              for bit in bits]
+                    print(vector, fourstate.evaluate(selected().netlist,
+                                                     vector))
+                else:
+                    parameters.chip.simulate_chip(
+                        selected, [int(bit) for bit in bits])
+                return
+        except ValueError as e:
+            print(e)
+            return
+        compiled = selected().netlist
+        if isinstance(source, stimulus.GrayCode):
+            results = stimulus.simulate_incremental(compiled, source)
+        else:
+            results = stimulus.simulate(compiled, source)
+        # Vectors are evaluated a chunk ahead, so count the ones printed
+        done = source.position
+        try:
+            for vector, outputs in results:
+                print(vector, outputs)
+                done += 1
+        except KeyboardInterrupt:
+            print('Stopped after {0} vectors; resume with START {0}'
+                  .format(done))
+
+def compare_chips(parameters):
+    name_a = input('Please enter the first chip to compare: ')
+    name_b = input('Please enter the second chip to compare: ')
+    if name_a not in parameters.chip.chips or \
+       name_b not in parameters.chip.chips:
+        print('No such chip!')
+        return
+    try:
+        found = equivalence.check_chips(parameters.chip, name_a, name_b)
+    except ValueError as e:
+        print(e)
+        return
+    if found is None:
+        print(name_a, 'and', name_b, 'are equivalent')
+    else:
+        inputs, outputs_a, outputs_b = found
+        print(name_a, 'and', name_b, 'differ on', inputs, ':', outputs_a,
+              '!=', outputs_b)
 
 def save(parameters):
     save_file_name = input('Please enter a file name to save to:')
-    pickle.dump(parameters.chip.chips, open(save_file_name, 'wb'))
+    library.save_library(parameters.chip, save_file_name)
 
 def load(parameters):
     load_file_name = input('Please enter a file name to load from:')
     if os.path.isfile(load_file_name):
-        parameters.chip.chips = pickle.load(open(load_file_name, 'rb'))
+        try:
+            library.load_library(parameters.chip, load_file_name)
+        except ValueError as e:
+            print(e)
 
 buttons = [Button('Deselect Chip', (150, 35), 70, 15, deselect_chip),
            Button('Simulate Chip', (150, 50), 70, 15, simulate),
@@ -96,45 +161,33 @@ buttons = [Button('Deselect Chip', (150, 35), 70, 15, deselect_chip),
            Button('Create Chip', (520, 20), 70, 15, make_chip),
            Button('Clear', (520, 40), 70, 15, clear),
            Button('Remove Gate', (520, 60), 70, 15, remove_gate),
-           # Does not work
-           # Button('Save', (520, 80), 70, 15, save),
-           # Button('Load', (520, 100), 70, 15, load)
+           Button('Save', (520, 80), 70, 15, save),
+           Button('Load', (520, 100), 70, 15, load),
+           Button('Compare Chips', (520, 120), 70, 15, compare_chips)
            ]
             
-def draw_interface(canvas):
-    global buttons
-    canvas.draw_text('Selected Chip:', (150, 20))
-    for b in buttons:
-        b.draw(canvas)
-
-def update_interface(canvas, parameters):
-    for gate in parameters.chip.gates:
-        gate.draw(canvas)
-    parameters.chip.draw(canvas)
-    canvas.draw_text(parameters.selected_chip, (230, 20))
-    for line in parameters.lines:
-        canvas.draw_polygon(line)
-    if parameters.add_chip:
-       canvas.draw_polygon(graphics.rectangle_points((300-3, 20-3), 56 , 21), filled = 0)
-    elif parameters.selected_remove_gate:
-       canvas.draw_polygon(graphics.rectangle_points((520-3, 60-3), 76 , 21), filled = 0)
-    elif parameters.start_connect != []:
-        x , y = parameters.start_connect[0]
-        canvas.draw_polygon(graphics.rectangle_points((x-7, y-7), 14, 14)
-                            , filled = 0)
+parser = argparse.ArgumentParser(description='Toggle verbose mode')
+parser.add_argument('--verbose', '-v', action='store_true')
+if parser.parse_args().verbose:
+    chip.verbose = True
+    instrument.Probe(echo = True).enable()
+    # Truth tables and generated code are not instrumented, so evaluate
+    # every chip with Netlist.evaluate where the probe sees each net change
+    editor_chip = chip.Chip('levelized', table_max_inputs = 0)
+else:
+    editor_chip = chip.Chip()
 
 canvas = graphics.Canvas(width = 600, height = 768)
-parameters = Parameters(chip.Chip())
+parameters = Parameters(editor_chip)
+screen = view.View(canvas, buttons)
 
 while True:
-    canvas.clear()
-    draw_interface(canvas)
-    update_interface(canvas, parameters)
+    screen.update(parameters)
     pos, _ = canvas.wait_for_click()
     pressed_chip = parameters.chip.click_on_chip(pos)
     #print(pos)
         
-    for gate in parameters.chip.gates:
+    for gate in parameters.chip.gates_at(pos):
         index, t = gate.click_position(pos)
         if index is not None:
             if parameters.start_connect != []:
@@ -158,17 +211,9 @@ while True:
         parameters.add_chip = False
 
     if parameters.selected_remove_gate:
-        for gate in parameters.chip.gates:
-            if gate.click_on_gate(pos):
-                parameters.chip.gates.remove(gate)
-                def remove_pin(pin, chip):
-                    if i in chip.connected_pins:
-                        chip.connected_pins.remove(i)
-                for i in gate.inputs:
-                    remove_pin(i, parameters.chip)
-                for i in gate.outputs:
-                    remove_pin(i, parameters.chip)
-                parameters.selected_remove_gate = False
+        for gate in parameters.chip.gates_at(pos):
+            parameters.chip.remove_gate(gate)
+            parameters.selected_remove_gate = False
 
     for b in buttons:
         b.do_action_if_clicked(pos, parameters)
@@ -0,0 +1,431 @@
+"""The netlist module compiles chips into flat, levelized gate lists.
+
+Every chip made by Chip.make_chip_from_gates is flattened into a Netlist: nets
+are integer indices, every gate is a primitive (and, or, not, pipe, a
+constant or a storage element) and gates are sorted so that each one only
+reads nets written by earlier gates.  One pass over the gate list therefore
+evaluates the whole chip, firing each gate exactly once per input vector.
+
+Storage elements keep their value in the net they drive.  A dff's output
+only changes when Netlist.clock copies its input into it, so dffs break
+feedback loops and are ignored when levelizing.  A latch passes its input
+through while its enable input is 1 and otherwise keeps its last output.
+Evaluating into a fresh value vector starts every storage element at 0.
+"""
+
+import hashlib
+
+from array import array
+
+AND, OR, NOT, PIPE, CONST0, CONST1, DFF, LATCH = range(8)
+
+OPCODE_NAMES = ['and_chip', 'or_chip', 'not_chip', 'pipe', 'const0', 'const1',
+                'dff', 'latch']
+OPCODE_ARITY = [2, 2, 1, 1, 0, 0, 1, 2]
+
+# Net index stored in the second input column of one-input gates
+NO_NET = -1
+
+class Netlist(object):
+    """A compiled chip made of primitive gates over integer-indexed nets.
+
+    A Netlist is an immutable template shared by every instance of a chip;
+    instances keep their own net values in a separate state vector.  Gates
+    are stored column-wise in typed arrays, one entry per gate, so a gate
+    costs a few bytes rather than a handful of Python objects.
+
+    n_nets  -- number of nets, numbered 0 .. n_nets - 1
+    inputs  -- net of each chip input pin, in pin order
+    outputs -- net of each chip output pin, in pin order
+    ops     -- opcode of each gate, in topological order
+    ins_a   -- first input net of each gate, or NO_NET for constants
+    ins_b   -- second input net of each gate, or NO_NET
+    outs    -- output net of each gate
+    names   -- dict from net to name, for the nets that have one
+    depth   -- number of gate levels between the inputs and the outputs
+    registers -- (input net, output net) of every dff
+    sequential -- whether the netlist has any storage elements
+    cones   -- fan-out cones computed so far, see fanout_cone
+    """
+
+    def __init__(self, n_nets, inputs, outputs, ops, ins_a, ins_b, outs,
+                 names=None, depth=0):
+        self.n_nets = n_nets
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.ops = column('B', ops)
+        self.ins_a = column('i', ins_a)
+        self.ins_b = column('i', ins_b)
+        self.outs = column('i', outs)
+        self.names = dict(names) if names is not None else {}
+        self.depth = depth
+        self.registers = tuple((a, out) for op, a, out
+                               in zip(self.ops, self.ins_a, self.outs)
+                               if op == DFF)
+        self.sequential = bool(self.registers) or LATCH in self.ops
+        self.cones = {}
+        self.readers = None
+        self.key = None
+
+    def __getstate__(self):
+        # Columns may be memoryviews into a mapped library file; cones are
+        # cheaper to recompute than to send to another process
+        state = dict(self.__dict__)
+        state['cones'], state['readers'] = {}, None
+        for key in ['ops', 'ins_a', 'ins_b', 'outs']:
+            if isinstance(state[key], memoryview):
+                state[key] = array(state[key].format, state[key])
+        return state
+
+    def structure_key(self):
+        """Return a digest of the gates and pins, ignoring net names.
+
+        Netlists with the same key are the same circuit gate for gate, so
+        one can stand in for the other.
+        """
+        if self.key is None:
+            digest = hashlib.sha1()
+            for values in [[self.n_nets, len(self.inputs), len(self.outputs),
+                            self.n_gates], self.inputs, self.outputs]:
+                digest.update(array('i', values).tobytes())
+            for values in [self.ops, self.ins_a, self.ins_b, self.outs]:
+                digest.update(bytes(values))
+            self.key = digest.hexdigest()
+        return self.key
+
+    @property
+    def n_gates(self):
+        return len(self.ops)
+
+    @property
+    def gates(self):
+        """The gates as (opcode, input nets, output net) triples."""
+        return [(op, tuple(net for net in (a, b) if net != NO_NET), out)
+                for op, a, b, out in zip(self.ops, self.ins_a, self.ins_b,
+                                         self.outs)]
+
+    def evaluate(self, input_values, values=None):
+        """Return the list of output values for one input vector.
+
+        values -- optional state vector of n_nets entries (such as a
+                  bytearray) that receives the value of every net and holds
+                  the contents of storage elements between calls
+        """
+        assert len(input_values) == len(self.inputs), \
+            'Expected {0} inputs, got {1}'.format(len(self.inputs),
+                                                  len(input_values))
+        if values is None:
+            values = [0] * self.n_nets
+        for net, value in zip(self.inputs, input_values):
+            values[net] = 1 if value else 0
+        for op, a, b, out in zip(self.ops, self.ins_a, self.ins_b, self.outs):
+            if op == AND:
+                values[out] = values[a] & values[b]
+            elif op == OR:
+                values[out] = values[a] | values[b]
+            elif op == NOT:
+                values[out] = values[a] ^ 1
+            elif op == PIPE:
+                values[out] = values[a]
+            elif op == LATCH:
+                if values[b]:
+                    values[out] = values[a]
+            elif op != DFF:
+                values[out] = 1 if op == CONST1 else 0
+        return [values[net] for net in self.outputs]
+
+    def evaluate_gates(self, gates, values, mask=1):
+        """Evaluate only the gates with the given indices, in order.
+
+        values is a state vector that holds the current value of every net
+        the gates read; gates must be in increasing order, such as a
+        fanout_cone, so that each gate sees its inputs already updated.
+        With a mask wider than 1, values holds packed words as for
+        evaluate_packed.
+        """
+        ops, ins_a, ins_b, outs = self.ops, self.ins_a, self.ins_b, self.outs
+        for g in gates:
+            op, a, out = ops[g], ins_a[g], outs[g]
+            if op == AND:
+                values[out] = values[a] & values[ins_b[g]]
+            elif op == OR:
+                values[out] = values[a] | values[ins_b[g]]
+            elif op == NOT:
+                values[out] = values[a] ^ mask
+            elif op == PIPE:
+                values[out] = values[a]
+            elif op == LATCH:
+                enable = values[ins_b[g]]
+                values[out] = values[a] & enable | \
+                    values[out] & (enable ^ mask)
+            elif op != DFF:
+                values[out] = mask if op == CONST1 else 0
+
+    def fanout_cone(self, net):
+        """Return the indices of the gates that net reaches, in gate order.
+
+        These are the gates to evaluate again when net changes.  Paths stop
+        at dffs, whose outputs only change when clocked.  Cones are computed
+        on first use and kept in self.cones, so every session of a chip
+        shares them.
+        """
+        cone = self.cones.get(net)
+        if cone is not None:
+            return cone
+        if self.readers is None:
+            self.readers = [[] for _ in range(self.n_nets)]
+            for g, (op, a, b) in enumerate(zip(self.ops, self.ins_a,
+                                               self.ins_b)):
+                if op != DFF:
+                    for source in {a, b} - {NO_NET}:
+                        self.readers[source].append(g)
+        reached = set()
+        stack = [net]
+        while stack:
+            for g in self.readers[stack.pop()]:
+                if g not in reached:
+                    reached.add(g)
+                    stack.append(self.outs[g])
+        cone = self.cones[net] = array('i', sorted(reached))
+        return cone
+
+    def evaluate_packed(self, input_words, width, values=None):
+        """Return output words for width input vectors packed into ints.
+
+        Bit b of every input and output word belongs to vector b, so one pass
+        over the gates evaluates all width vectors at once.  values is an
+        optional state vector of packed words, as for evaluate.
+        """
+        assert len(input_words) == len(self.inputs), \
+            'Expected {0} inputs, got {1}'.format(len(self.inputs),
+                                                  len(input_words))
+        mask = (1 << width) - 1
+        if values is None:
+            values = [0] * self.n_nets
+        for net, word in zip(self.inputs, input_words):
+            values[net] = word & mask
+        for op, a, b, out in zip(self.ops, self.ins_a, self.ins_b, self.outs):
+            if op == AND:
+                values[out] = values[a] & values[b]
+            elif op == OR:
+                values[out] = values[a] | values[b]
+            elif op == NOT:
+                values[out] = values[a] ^ mask
+            elif op == PIPE:
+                values[out] = values[a]
+            elif op == LATCH:
+                values[out] = values[a] & values[b] | \
+                    values[out] & (values[b] ^ mask)
+            elif op != DFF:
+                values[out] = mask if op == CONST1 else 0
+        return [values[net] for net in self.outputs]
+
+    def clock(self, values):
+        """Copy the input of every dff into its output, all at once.
+
+        values is a state vector that has just been evaluated.
+        """
+        updates = [values[d] for d, _ in self.registers]
+        for (_, q), value in zip(self.registers, updates):
+            values[q] = value
+
+    def evaluate_array(self, inputs):
+        """Return (N, len(outputs)) uint8 outputs for (N, len(inputs)) inputs.
+
+        Each gate is one vectorized NumPy operation over all N rows.  Nets are
+        released as soon as their last reader has run, so memory stays
+        proportional to the widest level rather than to the whole netlist.
+        """
+        import numpy
+        inputs = numpy.asarray(inputs, dtype=bool)
+        assert inputs.ndim == 2 and inputs.shape[1] == len(self.inputs), \
+            'Expected an (N, {0}) array, got shape {1}'.format(
+                len(self.inputs), inputs.shape)
+        last_read = {}
+        for g, (a, b) in enumerate(zip(self.ins_a, self.ins_b)):
+            last_read[a] = last_read[b] = g
+        for net in self.outputs:
+            last_read[net] = self.n_gates
+
+        values = [None] * self.n_nets
+        for net, column in zip(self.inputs, inputs.T):
+            values[net] = numpy.ascontiguousarray(column)
+        for g, (op, a, b, out) in enumerate(zip(self.ops, self.ins_a,
+                                                self.ins_b, self.outs)):
+            if op == AND:
+                values[out] = values[a] & values[b]
+            elif op == OR:
+                values[out] = values[a] | values[b]
+            elif op == NOT:
+                values[out] = ~values[a]
+            elif op == PIPE:
+                values[out] = values[a]
+            elif op == LATCH:
+                values[out] = values[a] & values[b]
+            else:
+                # Constants, and dffs holding their reset value
+                values[out] = numpy.full(inputs.shape[0], op == CONST1)
+            if a != NO_NET and last_read[a] == g:
+                values[a] = None
+            if b != NO_NET and last_read[b] == g:
+                values[b] = None
+
+        result = numpy.zeros((inputs.shape[0], len(self.outputs)),
+                             dtype=numpy.uint8)
+        for k, net in enumerate(self.outputs):
+            if values[net] is not None:
+                result[:, k] = values[net]
+        return result
+
+    def truth_table(self):
+        """Return the output tuple of every input vector, in vector order.
+
+        Entry v holds the outputs for the vector whose first pin is the most
+        significant bit of v, as produced by exhaustive_words.
+        """
+        n = len(self.inputs)
+        width = 1 << n
+        words = self.evaluate_packed(exhaustive_words(n, 0, width), width)
+        return [tuple(row) for row in unpack(words, width)]
+
+def column(typecode, values):
+    """Return values as a gate column of the given array typecode.
+
+    Memoryviews of the right format, such as slices of a memory-mapped chip
+    library, are used as they are instead of being copied.
+    """
+    if isinstance(values, memoryview) and values.format == typecode:
+        return values
+    return array(typecode, values)
+
+def exhaustive_words(n, start, width):
+    """Return packed input words for vectors start .. start + width - 1.
+
+    Vector v sets input pin k to bit n - 1 - k of v, so the vectors count up
+    in binary with the first pin as the most significant bit.  width must be a
+    power of two and start a multiple of width.
+    """
+    assert width & (width - 1) == 0 and start % width == 0, \
+        'Chunks must be aligned powers of two'
+    words = []
+    for k in range(n):
+        bit = n - 1 - k
+        period = 2 << bit
+        if period > width:
+            # Constant over the whole chunk
+            words.append((1 << width) - 1 if start >> bit & 1 else 0)
+        else:
+            half = period >> 1
+            block = ((1 << half) - 1) << half
+            words.append(block * ((1 << width) - 1) // ((1 << period) - 1))
+    return words
+
+def unpack(words, width):
+    """Return the width vectors packed in words as lists of bits."""
+    # Shifting a wide int once per vector is quadratic; read its digits instead
+    columns = [format(word, '0{0}b'.format(width))[::-1] for word in words]
+    return [[int(bit) for bit in row] for row in zip(*columns)] \
+        if columns else [[] for _ in range(width)]
+
+def primitive(op):
+    """Return the one-gate netlist of a primitive chip."""
+    if OPCODE_ARITY[op] == 1:
+        return Netlist(2, [0], [1], [op], [0], [NO_NET], [1], depth=1)
+    return Netlist(3, [0, 1], [2], [op], [0], [1], [2], depth=1)
+
+class NetlistBuilder(object):
+    """Accumulates gates from sub-chip netlists into one flat netlist."""
+
+    def __init__(self):
+        self.n_nets = 0
+        self.names = {}
+        self.ops = array('B')
+        self.ins_a = array('i')
+        self.ins_b = array('i')
+        self.outs = array('i')
+
+    def add_net(self, name=None):
+        if name is not None:
+            self.names[self.n_nets] = name
+        self.n_nets += 1
+        return self.n_nets - 1
+
+    def add_gate(self, op, a, b, out):
+        self.ops.append(op)
+        self.ins_a.append(a)
+        self.ins_b.append(b)
+        self.outs.append(out)
+
+    def inline(self, netlist, input_nets, output_nets):
+        """Copy the gates of netlist, wiring its pins to the given nets.
+
+        Internal nets of netlist become fresh anonymous nets.
+        """
+        nets = dict(zip(netlist.inputs, input_nets))
+        aliases = []
+        for net, outer in zip(netlist.outputs, output_nets):
+            if net in nets:
+                # The output is also an input or an earlier output
+                aliases.append((nets[net], outer))
+            else:
+                nets[net] = outer
+        nets[NO_NET] = NO_NET
+
+        for op, a, b, out in zip(netlist.ops, netlist.ins_a, netlist.ins_b,
+                                 netlist.outs):
+            for net in (a, b, out):
+                if net not in nets:
+                    nets[net] = self.add_net()
+            self.add_gate(op, nets[a], nets[b], nets[out])
+        for source, outer in aliases:
+            self.add_gate(PIPE, source, NO_NET, outer)
+
+    def build(self, inputs, outputs):
+        """Levelize the accumulated gates and return the Netlist."""
+        order, depth = levelize(self.ops, self.ins_a, self.ins_b, self.outs,
+                                self.n_nets)
+        return Netlist(self.n_nets, inputs, outputs,
+                       [self.ops[g] for g in order],
+                       [self.ins_a[g] for g in order],
+                       [self.ins_b[g] for g in order],
+                       [self.outs[g] for g in order], self.names, depth)
+
+def levelize(ops, ins_a, ins_b, outs, n_nets):
+    """Return the gate indices sorted by level and the number of levels.
+
+    Gates are given column-wise by their opcodes, input and output nets.  A
+    gate's level is one more than the highest level among the gates driving
+    its inputs; gates only driven by chip inputs, and dffs, are at level 1.
+    Raises ValueError if the gates contain a combinational loop.
+    """
+    n_gates = len(outs)
+    driver = array('i', [NO_NET]) * (n_nets + 1)
+    for g, out in enumerate(outs):
+        driver[out] = g
+    fanout = [[] for _ in range(n_gates)]
+    pending = array('i', [0]) * n_gates
+    for g in range(n_gates):
+        if ops[g] == DFF:
+            continue
+        for net in (ins_a[g], ins_b[g]):
+            # driver[NO_NET] is the extra last entry, which is never driven
+            if driver[net] != NO_NET:
+                fanout[driver[net]].append(g)
+                pending[g] += 1
+
+    level = array('i', [1]) * n_gates
+    ready = [g for g in range(n_gates) if pending[g] == 0]
+    visited = 0
+    while ready:
+        g = ready.pop()
+        visited += 1
+        for h in fanout[g]:
+            if level[g] + 1 > level[h]:
+                level[h] = level[g] + 1
+            pending[h] -= 1
+            if pending[h] == 0:
+                ready.append(h)
+    if visited != n_gates:
+        raise ValueError('Cannot make a chip with a combinational loop!')
+
+    return sorted(range(n_gates), key=level.__getitem__), max(level, default=0)
@@ -0,0 +1,156 @@
+"""The optimizer module removes redundant gates from flattened netlists.
+
+optimize runs these passes over a Netlist and counts the gates each removes:
+
+  pipes        pipe gates, replaced by the net they copy
+  inversions   not gates fed by a not gate, replaced by the original net
+  constants    gates whose output is fixed by constant inputs, or by an
+               input and its inverse, replaced by a shared constant net
+  simplified   and/or gates given the same net twice, or a constant that
+               does not decide the output, replaced by their other input
+  duplicates   gates computing the same operation on the same nets as an
+               earlier gate (common subexpressions), merged into it
+  dead         gates whose output reaches no chip output
+
+The first five passes are a single forward sweep in topological order, so a
+simplification immediately exposes further ones downstream.  Storage
+elements are never folded, and a dff's input is only resolved after the
+sweep since it may be driven by a later gate.
+"""
+
+from netlist import AND, OR, NOT, PIPE, CONST0, CONST1, DFF, NO_NET, \
+    Netlist, levelize
+
+PASSES = ['pipes', 'inversions', 'constants', 'simplified', 'duplicates',
+          'dead']
+
+def optimize(compiled):
+    """Return an equivalent, smaller Netlist and a dict of gates removed.
+
+    Input and output pins are kept in order, even if an input no longer
+    affects any output or an output becomes a copy of an input.
+    """
+    stats = dict((name, 0) for name in PASSES)
+    replaced = {}
+    def find(net):
+        while net in replaced:
+            net = replaced[net]
+        return net
+
+    constant = {}
+    constant_net = {}
+    inverse = {}
+    seen = {}
+    kept = []
+
+    def emit(op, a, b, out):
+        kept.append((op, a, b, out))
+        if op == NOT:
+            inverse[out] = a
+        elif op in (CONST0, CONST1):
+            constant[out] = int(op == CONST1)
+            constant_net[constant[out]] = out
+
+    def to_constant(value, out):
+        if value in constant_net:
+            stats['constants'] += 1
+            replaced[out] = constant_net[value]
+        else:
+            # The first folded gate becomes the shared constant
+            emit(CONST1 if value else CONST0, NO_NET, NO_NET, out)
+
+    for op, a, b, out in zip(compiled.ops, compiled.ins_a, compiled.ins_b,
+                             compiled.outs):
+        if op == DFF:
+            kept.append((op, a, b, out))
+            continue
+        if a != NO_NET:
+            a = find(a)
+        if b != NO_NET:
+            b = find(b)
+        if op == PIPE:
+            stats['pipes'] += 1
+            replaced[out] = a
+            continue
+        if op == NOT:
+            if a in constant:
+                to_constant(1 - constant[a], out)
+                continue
+            if a in inverse:
+                stats['inversions'] += 1
+                replaced[out] = inverse[a]
+                continue
+        elif op in (AND, OR):
+            # Value that decides the output on its own
+            absorbing = 0 if op == AND else 1
+            if constant.get(a) == absorbing or constant.get(b) == absorbing \
+                    or inverse.get(a) == b or inverse.get(b) == a:
+                to_constant(absorbing, out)
+                continue
+            if a == b or b in constant:
+                stats['simplified'] += 1
+                replaced[out] = a
+                continue
+            if a in constant:
+                stats['simplified'] += 1
+                replaced[out] = b
+                continue
+            a, b = min(a, b), max(a, b)
+        elif op in (CONST0, CONST1) and int(op == CONST1) in constant_net:
+            stats['duplicates'] += 1
+            replaced[out] = constant_net[int(op == CONST1)]
+            continue
+        key = (op, a, b)
+        if key in seen:
+            stats['duplicates'] += 1
+            replaced[out] = seen[key]
+            continue
+        seen[key] = out
+        emit(op, a, b, out)
+
+    kept = [(op, find(a), find(b), out) for op, a, b, out in kept]
+    outputs = [find(net) for net in compiled.outputs]
+    driver = dict((gate[3], gate) for gate in kept)
+    live = set()
+    stack = list(outputs)
+    while stack:
+        net = stack.pop()
+        if net not in live:
+            live.add(net)
+            if net in driver:
+                stack.extend(driver[net][1:3])
+    alive = [gate for gate in kept if gate[3] in live]
+    stats['dead'] = len(kept) - len(alive)
+    return renumber(compiled, alive, outputs, find), stats
+
+def renumber(compiled, gates, outputs, find):
+    """Return a Netlist of gates with its nets numbered densely.
+
+    Pin names follow their nets when those are replaced, unless the net they
+    are replaced with already has a name.
+    """
+    nets = {NO_NET: NO_NET}
+    def number(net):
+        if net not in nets:
+            nets[net] = len(nets) - 1
+        return nets[net]
+
+    inputs = [number(net) for net in compiled.inputs]
+    columns = [[], [], [], []]
+    for op, a, b, out in gates:
+        for column, value in zip(columns, (op, number(a), number(b),
+                                           number(out))):
+            column.append(value)
+    outputs = [number(net) for net in outputs]
+
+    names = {}
+    for net, name in sorted(compiled.names.items()):
+        net = find(net)
+        if net in nets and nets[net] not in names:
+            names[nets[net]] = name
+    order, depth = levelize(columns[0], columns[1], columns[2], columns[3],
+                            len(nets) - 1)
+    ops, ins_a, ins_b, outs = [[column[g] for g in order]
+                               for column in columns]
+    return Netlist(len(nets) - 1, inputs, outputs, ops, ins_a, ins_b, outs,
+                   names, depth)
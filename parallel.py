@@ -0,0 +1,125 @@
+"""The parallel module runs exhaustive simulations across processes.
+
+The 2**n input vectors of a compiled chip are split into aligned chunks of
+2**chunk_bits vectors.  Each worker process receives the Netlist once, when
+the pool starts, and then evaluates whole chunks bit-parallel; only chunk
+numbers and packed result words cross process boundaries.
+"""
+
+import os
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import netlist
+
+# The Netlist (and property) of the current worker process
+_worker_netlist = None
+_worker_check = None
+
+def _init_worker(compiled, check):
+    global _worker_netlist, _worker_check
+    _worker_netlist, _worker_check = compiled, check
+
+def _evaluate_chunk(start, width):
+    n = len(_worker_netlist.inputs)
+    words = netlist.exhaustive_words(n, start, width)
+    return _worker_netlist.evaluate_packed(words, width)
+
+def _check_chunk(start, width):
+    n = len(_worker_netlist.inputs)
+    words = netlist.exhaustive_words(n, start, width)
+    outputs = _worker_netlist.evaluate_packed(words, width)
+    return _worker_check(words, outputs, (1 << width) - 1)
+
+def chunks(n, chunk_bits):
+    """Return the chunk width and the start of every chunk of 2**n vectors."""
+    width = 1 << min(n, chunk_bits)
+    return width, range(0, 1 << n, width)
+
+def run_chunks(compiled, task, check=None, workers=None, chunk_bits=16):
+    """Yield (start, width, result) of task for every chunk, in order.
+
+    At most a few chunks per worker are in flight at a time, so results can
+    be consumed as a stream; closing the generator cancels the rest.
+    workers defaults to the number of CPUs; with one worker the chunks are
+    evaluated in this process.
+    """
+    width, starts = chunks(len(compiled.inputs), chunk_bits)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        _init_worker(compiled, check)
+        for start in starts:
+            yield start, width, task(start, width)
+        return
+
+    pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                               initargs=(compiled, check))
+    pending = deque()
+    starts = iter(starts)
+    try:
+        for start in starts:
+            pending.append((start, pool.submit(task, start, width)))
+            if len(pending) >= 4 * workers:
+                start, future = pending.popleft()
+                yield start, width, future.result()
+        while pending:
+            start, future = pending.popleft()
+            yield start, width, future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def truth_table(compiled, workers=None, chunk_bits=16, output_file=None):
+    """Return the packed output words of compiled over all 2**n inputs.
+
+    Bit v of output word k is output k for input vector v, numbered as in
+    netlist.exhaustive_words.  If output_file is given, results are instead
+    streamed to it chunk by chunk and None is returned: every chunk writes,
+    for each output in turn, width bits as little-endian bytes.
+    """
+    results = [0] * len(compiled.outputs)
+    stream = run_chunks(compiled, _evaluate_chunk, None, workers, chunk_bits)
+    if output_file is not None:
+        with open(output_file, 'wb') as f:
+            for start, width, words in stream:
+                for word in words:
+                    f.write(word.to_bytes((width + 7) // 8, 'little'))
+        return None
+    for start, width, words in stream:
+        for k, word in enumerate(words):
+            results[k] |= word << start
+    return results
+
+def find_counterexample(compiled, check, workers=None, chunk_bits=16):
+    """Return the first input vector violating check, or None.
+
+    check(input_words, output_words, mask) is called with the packed words
+    of a chunk and returns a word with a bit set for every failing vector.
+    It must be picklable, such as a module-level function or a Matches
+    instance.  The search stops at the first chunk containing a failure.
+    Returns (inputs, outputs) lists of the failing vector.
+    """
+    n = len(compiled.inputs)
+    stream = run_chunks(compiled, _check_chunk, check, workers, chunk_bits)
+    for start, width, failures in stream:
+        if failures:
+            stream.close()
+            v = start + (failures & -failures).bit_length() - 1
+            inputs = [v >> (n - 1 - k) & 1 for k in range(n)]
+            return inputs, compiled.evaluate(inputs)
+    return None
+
+class Matches(object):
+    """Property that a chip's outputs equal those of a reference Netlist."""
+
+    def __init__(self, reference):
+        self.reference = reference
+
+    def __call__(self, input_words, output_words, mask):
+        width = mask.bit_length()
+        expected = self.reference.evaluate_packed(input_words, width)
+        failures = 0
+        for word, reference_word in zip(output_words, expected):
+            failures |= word ^ reference_word
+        return failures
@@ -0,0 +1,64 @@
+"""The session module simulates a chip incrementally as its inputs change.
+
+A Session keeps the value of every net of one chip between calls.  When
+some input pins change, only the gates in the fan-out cones of those pins
+are evaluated again, so flipping one input costs in proportion to the logic
+it can affect rather than to the whole chip.
+
+    s = session.Session(c.chips['adder_64']().netlist)
+    s.set_inputs({0: 1, 5: 1})
+    s.set_inputs({5: 0})
+    print(s.outputs())
+"""
+
+class Session(object):
+    """Persistent net state of one instance of a compiled chip.
+
+    The session starts from reset with every input at 0.
+    """
+
+    def __init__(self, compiled):
+        self.netlist = compiled
+        self.values = [0] * compiled.n_nets
+        compiled.evaluate([0] * len(compiled.inputs), self.values)
+
+    def inputs(self):
+        """Return the current input values, in pin order."""
+        return [self.values[net] for net in self.netlist.inputs]
+
+    def outputs(self):
+        """Return the current output values, in pin order."""
+        return [self.values[net] for net in self.netlist.outputs]
+
+    def set_inputs(self, changes):
+        """Set input pins from a dict {pin: value}; return the outputs."""
+        changed = []
+        for pin, value in changes.items():
+            net = self.netlist.inputs[pin]
+            value = 1 if value else 0
+            if self.values[net] != value:
+                self.values[net] = value
+                changed.append(net)
+        self.update(changed)
+        return self.outputs()
+
+    def clock(self):
+        """Load every dff at once; return the outputs after the edge."""
+        values = self.values
+        before = [values[q] for _, q in self.netlist.registers]
+        self.netlist.clock(values)
+        self.update([q for (_, q), value in zip(self.netlist.registers,
+                                                before)
+                     if values[q] != value])
+        return self.outputs()
+
+    def update(self, nets):
+        """Evaluate again every gate reached by the changed nets."""
+        if not nets:
+            return
+        cones = [self.netlist.fanout_cone(net) for net in nets]
+        if len(cones) == 1:
+            gates = cones[0]
+        else:
+            gates = sorted(set().union(*cones))
+        self.netlist.evaluate_gates(gates, self.values)
@@ -0,0 +1,63 @@
+"""The spatial module finds which rectangles on the canvas contain a point.
+
+A GridIndex divides the plane into square cells and remembers which items
+overlap each cell.  A point lookup only tests the items of the one cell the
+point falls in, so hit-testing a click costs about the same however many
+gates are on the canvas.
+"""
+
+class GridIndex(object):
+    """Items with rectangles (x, y, width, height) in a uniform grid."""
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        # Cell (column, row) -> dict of the items overlapping it, in the
+        # order they were inserted
+        self.cells = {}
+        self.rects = {}
+
+    def __len__(self):
+        return len(self.rects)
+
+    def cells_of(self, rect):
+        x, y, width, height = rect
+        size = self.cell_size
+        for column in range(int(x // size),
+                            int((x + max(width, 1) - 1) // size) + 1):
+            for row in range(int(y // size),
+                             int((y + max(height, 1) - 1) // size) + 1):
+                yield column, row
+
+    def insert(self, item, rect):
+        """Add item at rect, or move it there if it is already indexed."""
+        if item in self.rects:
+            self.remove(item)
+        self.rects[item] = rect
+        for cell in self.cells_of(rect):
+            self.cells.setdefault(cell, {})[item] = None
+
+    def remove(self, item):
+        """Remove item from the index; does nothing if it is not there."""
+        rect = self.rects.pop(item, None)
+        if rect is None:
+            return
+        for cell in self.cells_of(rect):
+            items = self.cells[cell]
+            del items[item]
+            if not items:
+                del self.cells[cell]
+
+    def clear(self):
+        self.cells.clear()
+        self.rects.clear()
+
+    def query(self, pos):
+        """Return the items whose rectangles contain pos, in insert order."""
+        px, py = pos
+        size = self.cell_size
+        found = []
+        for item in self.cells.get((int(px // size), int(py // size)), ()):
+            x, y, width, height = self.rects[item]
+            if x <= px < x + width and y <= py < y + height:
+                found.append(item)
+        return found
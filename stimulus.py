@@ -0,0 +1,168 @@
+"""The stimulus module generates input vectors lazily, chunk by chunk.
+
+A source yields the vectors of a chip with n inputs one at a time, or in
+chunks, without ever building the whole list, so exhaustive runs are only
+limited by time.  Each source counts the vectors it has produced in
+position; a run can be checkpointed by saving position and resumed by
+passing it back as start.
+
+    source = stimulus.GrayCode(len(compiled.inputs))
+    for vector, outputs in stimulus.simulate_incremental(compiled, source):
+        ...
+
+A vector is a list of bits in pin order.  Exhaustive vectors count up in
+binary with the first pin as the most significant bit, as in
+netlist.exhaustive_words.
+"""
+
+import itertools
+import random
+
+import netlist
+import session
+
+def bits(n, v):
+    """Return the n-bit vector whose pins are the binary digits of v."""
+    return [v >> (n - 1 - k) & 1 for k in range(n)]
+
+def pack(vectors):
+    """Return the packed input words of vectors, as for evaluate_packed."""
+    # Bit v of input word k is pin k of vectors[v]
+    return [int(''.join(str(int(bit)) for bit in reversed(pins)), 2)
+            for pins in zip(*vectors)]
+
+class Stimulus(object):
+    """A resumable stream of input vectors.
+
+    n        -- number of inputs
+    total    -- number of vectors in the stream, or None if unbounded
+    position -- index of the next vector
+    """
+
+    def __init__(self, n, total, start=0):
+        if start < 0 or total is not None and start > total:
+            raise ValueError('Start {0} is outside the {1} vectors'.format(
+                start, total))
+        self.n = n
+        self.total = total
+        self.position = start
+
+    def __iter__(self):
+        while self.total is None or self.position < self.total:
+            vector = self.vector(self.position)
+            self.position += 1
+            yield vector
+
+    def vector(self, index):
+        """Return the vector at index of the stream."""
+        raise NotImplementedError
+
+    def chunks(self, size):
+        """Yield lists of the next size vectors until the stream ends."""
+        vectors = iter(self)
+        while True:
+            chunk = list(itertools.islice(vectors, size))
+            if not chunk:
+                return
+            yield chunk
+
+    def packed_chunks(self, width):
+        """Yield (input words, count) for every chunk of width vectors."""
+        for chunk in self.chunks(width):
+            yield pack(chunk), len(chunk)
+
+    def progress(self):
+        """Return the fraction of vectors produced, or None if unbounded."""
+        if self.total is None:
+            return None
+        if not self.total:
+            return 1.0
+        return self.position / self.total
+
+class Exhaustive(Stimulus):
+    """Every one of the 2**n vectors, in binary counting order."""
+
+    def __init__(self, n, start=0):
+        Stimulus.__init__(self, n, 1 << n, start)
+
+    def vector(self, index):
+        return bits(self.n, index)
+
+    def packed_chunks(self, width):
+        # Aligned chunks are made directly as words, without any vectors
+        if width & (width - 1) or self.position % width:
+            for chunk in Stimulus.packed_chunks(self, width):
+                yield chunk
+            return
+        width = min(width, self.total)
+        while self.position < self.total:
+            start = self.position
+            self.position += width
+            yield netlist.exhaustive_words(self.n, start, width), width
+
+class GrayCode(Stimulus):
+    """Every one of the 2**n vectors, each differing from the last in one pin.
+
+    Vector i is the binary digits of i ^ (i >> 1), so the walk starts from
+    all zeros and an incremental simulator evaluates only the fan-out cone
+    of one pin per step.
+    """
+
+    def __init__(self, n, start=0):
+        Stimulus.__init__(self, n, 1 << n, start)
+
+    def vector(self, index):
+        return bits(self.n, index ^ (index >> 1))
+
+class Random(Stimulus):
+    """Uniformly random vectors, the same for the same seed.
+
+    The stream is drawn in blocks of block vectors from a generator seeded
+    by the seed and the block number, so resuming only draws again the
+    vectors before start in its block.  count of None never ends.
+    """
+
+    def __init__(self, n, count=None, seed=0, start=0, block=4096):
+        Stimulus.__init__(self, n, count, start)
+        self.seed = seed
+        self.block = block
+        # The generator of block number rng_block, which has drawn the
+        # vectors of the block before rng_offset
+        self.rng = None
+        self.rng_block = None
+        self.rng_offset = 0
+
+    def vector(self, index):
+        number, offset = divmod(index, self.block)
+        if number != self.rng_block or offset < self.rng_offset:
+            self.rng = random.Random('{0}:{1}'.format(self.seed, number))
+            self.rng_block = number
+            self.rng_offset = 0
+        while self.rng_offset <= offset:
+            v = self.rng.getrandbits(self.n)
+            self.rng_offset += 1
+        return bits(self.n, v)
+
+def simulate(compiled, source, chunk=4096):
+    """Yield (vector, outputs) of a Netlist for every vector of source.
+
+    Each chunk of vectors is evaluated at once, bit-parallel, from reset.
+    """
+    for words, width in source.packed_chunks(chunk):
+        rows = netlist.unpack(words, width)
+        outputs = netlist.unpack(compiled.evaluate_packed(words, width),
+                                 width)
+        for vector, row in zip(rows, outputs):
+            yield vector, row
+
+def simulate_incremental(compiled, source):
+    """Yield (vector, outputs) of a Netlist for every vector of source.
+
+    A Session evaluates only the gates that the pins changed since the
+    previous vector can reach, which is least work for a GrayCode.
+    """
+    s = session.Session(compiled)
+    for vector in source:
+        changes = dict((k, bit) for k, (bit, last)
+                       in enumerate(zip(vector, s.inputs())) if bit != last)
+        yield vector, s.set_inputs(changes)
@@ -0,0 +1,132 @@
+"""The vcd module writes simulation traces as Value Change Dump files.
+
+A VCDWriter records chosen nets of a compiled chip, by default every named
+net: the pins and the in/out connectors of the gates it was made from.  It
+is given the state vector after each evaluation and writes a record only
+for the nets that changed, through a buffered file, so a trace of any
+length runs in constant memory.  Waveform viewers such as GTKWave read the
+result.
+
+    writer = vcd.VCDWriter('adder.vcd', compiled)
+    values = [0] * compiled.n_nets
+    for inputs in stimulus:
+        compiled.evaluate(inputs, values)
+        writer.sample(values)
+    writer.close()
+"""
+
+import time
+
+# Characters of VCD identifier codes
+CODE_CHARS = ''.join(chr(c) for c in range(33, 127))
+
+def identifier(n):
+    """Return the n-th VCD identifier code: '!', '"', ..., '!!', ..."""
+    code = CODE_CHARS[n % len(CODE_CHARS)]
+    n //= len(CODE_CHARS)
+    while n:
+        n -= 1
+        code += CODE_CHARS[n % len(CODE_CHARS)]
+        n //= len(CODE_CHARS)
+    return code
+
+class VCDWriter(object):
+    """Writes the values of nets of a Netlist to a VCD file.
+
+    nets      -- net numbers or names to record, by default every named net
+    module    -- scope name the nets appear under
+    timescale -- duration of one time step, such as '1ns'
+    lane      -- the bit of each value that sample records, which picks one
+                 copy of a bit-parallel CycleEngine
+    """
+
+    def __init__(self, file_name, compiled, nets=None, module='chip',
+                 timescale='1ns', lane=0):
+        numbers = dict((name, net) for net, name in compiled.names.items())
+        if nets is None:
+            nets = sorted(compiled.names)
+        self.nets = []
+        for net in nets:
+            net = numbers.get(net, net)
+            if not isinstance(net, int) or not 0 <= net < compiled.n_nets:
+                raise ValueError('No net named ' + str(net))
+            self.nets.append(net)
+        self.codes = [identifier(k) for k in range(len(self.nets))]
+        self.last = [None] * len(self.nets)
+        self.lane = lane
+        self.time = 0
+        self.file = open(file_name, 'w', buffering=1 << 16)
+
+        header = ['$date {0} $end'.format(time.asctime()),
+                  '$version Logic-Simulator $end',
+                  '$timescale {0} $end'.format(timescale),
+                  '$scope module {0} $end'.format(module)]
+        for net, code in zip(self.nets, self.codes):
+            name = compiled.names.get(net, 'net' + str(net))
+            header.append('$var wire 1 {0} {1} $end'.format(code, name))
+        header += ['$upscope $end', '$enddefinitions $end', '']
+        self.file.write('\n'.join(header))
+
+    def sample(self, values, time=None):
+        """Record the nets in state vector values at time.
+
+        time defaults to one step after the previous sample.
+        """
+        if time is None:
+            time = self.time
+        lines = []
+        for k, net in enumerate(self.nets):
+            value = values[net] >> self.lane & 1
+            if value != self.last[k]:
+                self.last[k] = value
+                lines.append(str(value) + self.codes[k])
+        if lines:
+            self.file.write('#{0}\n{1}\n'.format(time, '\n'.join(lines)))
+        self.time = time + 1
+
+    def sample_packed(self, values, width, time=None):
+        """Record width vectors packed into the words of values.
+
+        Bit v of every word is the vector at time + v.  Changes are found
+        with word operations, so the cost grows with the number of changes
+        rather than with width.
+        """
+        if time is None:
+            time = self.time
+        mask = (1 << width) - 1
+        changes = []
+        for k, net in enumerate(self.nets):
+            word = values[net] & mask
+            previous = self.last[k]
+            if previous is None:
+                previous = (word & 1) ^ 1
+            # Bit v is set where vector v differs from vector v - 1
+            diff = word ^ ((word << 1 | previous) & mask)
+            while diff:
+                low = diff & -diff
+                v = low.bit_length() - 1
+                changes.append((v, str(word >> v & 1) + self.codes[k]))
+                diff ^= low
+            self.last[k] = word >> (width - 1) & 1
+        changes.sort()
+        lines = []
+        current = None
+        for v, record in changes:
+            if v != current:
+                current = v
+                lines.append('#' + str(time + v))
+            lines.append(record)
+        if lines:
+            self.file.write('\n'.join(lines) + '\n')
+        self.time = time + width
+
+    def close(self):
+        """Write the final time and close the file."""
+        self.file.write('#{0}\n'.format(self.time))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
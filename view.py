@@ -0,0 +1,89 @@
+"""The view module draws the chip editor in retained mode.
+
+The editor used to clear the canvas and draw every gate, wire and label
+again after each click.  A View instead keeps the Tk item ids of
+everything it has drawn and, on each update, only creates or deletes the
+items of what changed, so a click costs the same however many gates are on
+the canvas.
+"""
+
+import graphics
+
+class View(object):
+    """The Tk items of the editor canvas and the state they show."""
+
+    def __init__(self, canvas, buttons):
+        self.canvas = canvas
+        canvas.draw_text('Selected Chip:', (150, 20))
+        for b in buttons:
+            b.draw(canvas)
+        self.selected = None
+        self.selected_item = canvas.draw_text('', (230, 20))
+        # Items of every gate, and of every wire by the id of its line
+        self.gate_items = {}
+        self.line_items = {}
+        self.library = None
+        self.library_items = []
+        self.highlight = None
+        self.highlight_item = None
+
+    def update(self, parameters):
+        """Bring the canvas up to date with the editor parameters."""
+        self.update_gates(parameters.chip.gates)
+        self.update_lines(parameters.lines)
+        self.update_library(parameters.chip)
+        if parameters.selected_chip != self.selected:
+            self.selected = parameters.selected_chip
+            self.canvas.edit_text(self.selected_item, text = self.selected
+                                  or '')
+        self.update_highlight(parameters)
+
+    def delete(self, items):
+        for item in items:
+            self.canvas.delete(item)
+
+    def update_gates(self, gates):
+        current = set(gates)
+        for gate in [g for g in self.gate_items if g not in current]:
+            self.delete(self.gate_items.pop(gate))
+        for gate in gates:
+            if gate not in self.gate_items:
+                self.gate_items[gate] = gate.draw(self.canvas)
+
+    def update_lines(self, lines):
+        current = set(id(line) for line in lines)
+        for key in [k for k in self.line_items if k not in current]:
+            self.canvas.delete(self.line_items.pop(key)[1])
+        for line in lines:
+            if id(line) not in self.line_items:
+                # The line is kept so that its id is not reused
+                self.line_items[id(line)] = (line,
+                                             self.canvas.draw_polygon(line))
+
+    def update_library(self, c):
+        names = list(c.chips)
+        if names != self.library:
+            self.library = names
+            self.delete(self.library_items)
+            self.library_items = c.draw(self.canvas)
+
+    def update_highlight(self, parameters):
+        # The box around the active button or the first pin of a wire
+        if parameters.add_chip:
+            box = ((300-3, 20-3), 56, 21)
+        elif parameters.selected_remove_gate:
+            box = ((520-3, 60-3), 76, 21)
+        elif parameters.start_connect != []:
+            x, y = parameters.start_connect[0]
+            box = ((x-7, y-7), 14, 14)
+        else:
+            box = None
+        if box == self.highlight:
+            return
+        if self.highlight_item is not None:
+            self.canvas.delete(self.highlight_item)
+            self.highlight_item = None
+        self.highlight = box
+        if box is not None:
+            self.highlight_item = self.canvas.draw_polygon(
+                graphics.rectangle_points(*box), filled = 0)